@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from recommender import POLICIES, HybridRecommender
+
+MAX_N = 100
+
+# ==== HTTP endpoint (thư viện chuẩn, không cần Flask) ====
+#   GET /recommend?category=<cate>&user=<user_id>&n=10 -> {"items": [...], "scores": [...], "model": ...}
+#   GET /health                                        -> {"status": "ok", "categories": [...]}
+#   GET /stats                                         -> thống kê LRU cache của từng category
+# category có thể bỏ qua nếu server chỉ phục vụ một category. Dùng HTTP/1.1 keep-alive.
+class RecommendHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Header và body được ghi bằng 2 lần send: tắt Nagle để không chờ delayed ACK (~40ms mỗi request)
+    disable_nagle_algorithm = True
+    recommenders = {}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path == "/recommend":
+            self.handle_recommend(params)
+        elif url.path == "/health":
+            self.send_json(200, {"status": "ok", "categories": sorted(self.recommenders)})
+        elif url.path == "/stats":
+            self.send_json(200, {cate: recommender.cache_info()._asdict()
+                                 for cate, recommender in self.recommenders.items()})
+        else:
+            self.send_json(404, {"error": f"unknown path {url.path}"})
+
+    def handle_recommend(self, params):
+        start = time.perf_counter()
+        cate = params.get("category") or (next(iter(self.recommenders)) if len(self.recommenders) == 1 else None)
+        if cate not in self.recommenders:
+            self.send_json(400, {"error": f"category must be one of {sorted(self.recommenders)}"})
+            return
+        if "user" not in params:
+            self.send_json(400, {"error": "missing user"})
+            return
+        try:
+            n = int(params.get("n", 10))
+        except ValueError:
+            n = 0
+        if not 1 <= n <= MAX_N:
+            self.send_json(400, {"error": f"n must be an integer in [1, {MAX_N}]"})
+            return
+
+        recommendations, model = self.recommenders[cate].recommend(params["user"], n)
+        self.send_json(200, {"category": cate, "user": params["user"], "model": model,
+                             "items": [item for item, _ in recommendations],
+                             "scores": [round(score, 6) for _, score in recommendations],
+                             "latency_ms": round((time.perf_counter() - start) * 1000, 3)})
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Không in log mỗi request (làm chậm khi load test)
+    def log_message(self, format, *args):
+        pass
+
+def serve(output_dir, categories, host="127.0.0.1", port=8000, policy="blend", min_interactions=5, shrink=10.0,
+          cache_size=10000):
+    RecommendHandler.recommenders = {
+        cate: HybridRecommender(os.path.join(output_dir, cate), cate, policy, min_interactions, shrink, cache_size)
+        for cate in categories}
+    server = ThreadingHTTPServer((host, port), RecommendHandler)
+    print(f"🚀 Serving {', '.join(categories)} ({policy}) on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+# ==== Gọi script từ dòng lệnh ====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default="../data/output", help="Thư mục output của pre_process.py")
+    parser.add_argument("--categories", nargs='+', required=True, help="Các category đã chạy candidates.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--policy", default="blend", choices=POLICIES, help="Cách kết hợp item-KNN và phổ biến")
+    parser.add_argument("--min_interactions", type=int, default=5,
+                        help="switch: số tương tác tối thiểu để dùng item-KNN")
+    parser.add_argument("--shrink", type=float, default=10.0, help="blend: trọng số KNN = d / (d + shrink)")
+    parser.add_argument("--cache_size", type=int, default=10000, help="Số kết quả giữ trong LRU cache mỗi category")
+    args = parser.parse_args()
+
+    serve(args.output_dir, args.categories, args.host, args.port, args.policy, args.min_interactions, args.shrink,
+          args.cache_size)
+
+# === RUN ===: python app.py --output_dir ../data/output --categories Gift_Cards --policy blend --port 8000
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import scipy.sparse as sp
+from tqdm import tqdm
+
+# Dùng chung output của preprocessing/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "preprocessing"))
+from id_dictionary import IdDictionary
+from similarity import (BLOCK_PAIRS, TOPK_MANIFEST, build_interaction_matrix, load_train_pairs, load_topk, save_csr,
+                        select_topk, split_by_cost)
+
+SERVE_FILES = {
+    "knn_indices": "{cate}.serve_knn.indices.npy",
+    "knn_scores": "{cate}.serve_knn.scores.npy",
+    "popularity": "{cate}.serve_popularity.npy",
+    "popular": "{cate}.serve_popular.npy",
+}
+SERVE_MANIFEST = "{cate}.serve.json"
+ID_DICTS = {"user": "{cate}_user_dict", "item": "{cate}_item_dict"}
+
+# ==== Từ điển ID memory-map cho serving ====
+# Dùng *_user_dict / *_item_dict nếu đã có (--persistent_ids), nếu không chuyển một lần từ *_user2id.json / *_item2id.json.
+def ensure_id_dictionaries(category_dir, cate_name):
+    for kind, dict_name in ID_DICTS.items():
+        path = os.path.join(category_dir, dict_name.format(cate=cate_name))
+        if os.path.exists(os.path.join(path, "keys.npy")):
+            continue
+        with open(os.path.join(category_dir, f"{cate_name}_{kind}2id.json"), "r") as f:
+            IdDictionary.from_mapping(path, json.load(f)).save()
+
+# ==== Top-C item cho mỗi user theo item-KNN, bỏ item user đã tương tác ====
+# Điểm(u, j) = tổng độ tương đồng s(i, j) với i là các item u đã tương tác và j nằm trong top-K láng giềng của i,
+# tức là matrix @ neighbors. Chi phí = số tương tác x K (dùng neighbors.T như ItemKNNScorer sẽ nhân qua danh sách
+# "là láng giềng của" của item phổ biến, có thể lớn gấp hàng trăm lần). Tích sparse được tính theo block user.
+def knn_candidates(matrix, neighbor_indices, neighbor_scores, num_candidates, indices_file, scores_file,
+                   block_pairs=BLOCK_PAIRS, desc=None):
+    num_users, num_items = matrix.shape
+    neighbor_indices = np.asarray(neighbor_indices)
+    rows, cols = np.nonzero(neighbor_indices >= 0)
+    neighbors = sp.csr_matrix((np.asarray(neighbor_scores)[rows, cols], (rows, neighbor_indices[rows, cols])),
+                              shape=(num_items, num_items))
+
+    indices = np.lib.format.open_memmap(indices_file + ".tmp", mode="w+", dtype=np.int32,
+                                        shape=(num_users, num_candidates))
+    scores = np.lib.format.open_memmap(scores_file + ".tmp", mode="w+", dtype=np.float32,
+                                       shape=(num_users, num_candidates))
+    for start, end in tqdm(split_by_cost(matrix @ np.diff(neighbors.indptr).astype(np.float64), block_pairs),
+                           desc=desc):
+        block = matrix[start:end]
+        product = block @ neighbors
+        product = (product - product.multiply(block)).tocoo()  # bỏ item đã tương tác
+        keep = product.data > 0
+        indices[start:end], scores[start:end] = select_topk(product.row[keep], product.col[keep],
+                                                            product.data[keep], end - start, num_candidates)
+
+    indices.flush()
+    scores.flush()
+    del indices, scores
+    os.replace(indices_file + ".tmp", indices_file)
+    os.replace(scores_file + ".tmp", scores_file)
+
+# ==== Chuẩn bị toàn bộ artifact serving của một category ====
+# Cần chạy preprocessing/similarity.py trước (top-K item-item). Ghi: CSR train (để lọc item đã tương tác),
+# top-C item-KNN mỗi user, độ phổ biến của mọi item và num_popular item phổ biến nhất, từ điển ID và manifest.
+def build_serving(output_dir, cate_name, num_candidates=200, num_popular=1000):
+    category_dir = os.path.join(output_dir, cate_name)
+    if not os.path.exists(os.path.join(category_dir, TOPK_MANIFEST.format(cate=cate_name, kind="item"))):
+        raise FileNotFoundError(f"Run preprocessing/similarity.py for {cate_name} before building serving files")
+    ensure_id_dictionaries(category_dir, cate_name)
+
+    train_data, num_users, num_items = load_train_pairs(category_dir, cate_name)
+    matrix = build_interaction_matrix(train_data, num_users, num_items)
+    save_csr(matrix, category_dir, cate_name)
+
+    topk_manifest, topk = load_topk(category_dir, cate_name, "item")
+    # Item không xuất hiện trong train không có hàng trong ma trận tương đồng
+    neighbor_indices = np.full((num_items, topk_manifest["k"]), -1, dtype=np.int32)
+    neighbor_scores = np.zeros((num_items, topk_manifest["k"]), dtype=np.float32)
+    neighbor_indices[:topk_manifest["rows"]], neighbor_scores[:topk_manifest["rows"]] = topk["indices"], topk["scores"]
+
+    files = {name: file_name.format(cate=cate_name) for name, file_name in SERVE_FILES.items()}
+    knn_candidates(matrix, neighbor_indices, neighbor_scores, num_candidates,
+                   os.path.join(category_dir, files["knn_indices"]), os.path.join(category_dir, files["knn_scores"]),
+                   desc=f"Candidates {cate_name}")
+
+    popularity = np.diff(matrix.T.tocsr().indptr).astype(np.float32)
+    np.save(os.path.join(category_dir, files["popularity"]), popularity)
+    np.save(os.path.join(category_dir, files["popular"]),
+            np.lexsort((np.arange(num_items), -popularity))[:num_popular].astype(np.int32))
+
+    manifest = {"category": cate_name, "num_users": num_users, "num_items": num_items,
+                "num_candidates": num_candidates, "num_popular": min(num_popular, num_items),
+                "similarity": {name: topk_manifest[name] for name in ("metric", "k")}, "files": files,
+                "id_dicts": {kind: name.format(cate=cate_name) for kind, name in ID_DICTS.items()}}
+    with open(os.path.join(category_dir, SERVE_MANIFEST.format(cate=cate_name)), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✅ Saved serving files of {cate_name} ({num_users} users, {num_items} items) to {category_dir}")
+
+# ==== Gọi script từ dòng lệnh ====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default="../data/output", help="Thư mục output của pre_process.py")
+    parser.add_argument("--categories", nargs='+', required=True, help="Danh sách tên category")
+    parser.add_argument("--num_candidates", type=int, default=200, help="Số item-KNN candidate lưu cho mỗi user")
+    parser.add_argument("--num_popular", type=int, default=1000, help="Số item phổ biến nhất lưu cho cold-start")
+    args = parser.parse_args()
+
+    for cate_name in args.categories:
+        build_serving(args.output_dir, cate_name, args.num_candidates, args.num_popular)
+
+# === RUN ===: python candidates.py --output_dir ../data/output --categories Gift_Cards --num_candidates 200
@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import http.client
+import numpy as np
+from urllib.parse import urlencode, urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "preprocessing"))
+from candidates import ID_DICTS
+from id_dictionary import IdDictionary
+from recommender import POLICIES, HybridRecommender
+
+# ==== Chọn user cho các request ====
+# User được rút theo phân phối Zipf (một số user "nóng" chiếm phần lớn request, giống traffic thật) để đo cả
+# hiệu quả của LRU cache; cold_fraction request dùng user không có trong train.
+def sample_users(category_dir, cate_name, num_requests, zipf=1.2, cold_fraction=0.05, seed=42):
+    user_dict = IdDictionary.load(os.path.join(category_dir, ID_DICTS["user"].format(cate=cate_name)))
+    rng = np.random.default_rng(seed)
+    ranks = (rng.zipf(zipf, num_requests) - 1) % len(user_dict) if zipf > 1 else rng.integers(len(user_dict),
+                                                                                              size=num_requests)
+    users = [user.decode() for user in user_dict.reverse(rng.permutation(len(user_dict))[ranks])]
+    for i in np.flatnonzero(rng.random(num_requests) < cold_fraction):
+        users[i] = f"cold-user-{i}"
+    return users
+
+# ==== Gửi request song song và đo latency từng request ====
+# Mỗi thread giữ một kết nối HTTP/1.1 keep-alive riêng.
+def run_http(url, cate_name, users, n=10, concurrency=8):
+    target = urlparse(url)
+    local = threading.local()
+
+    def request(user):
+        if not hasattr(local, "connection"):
+            local.connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        start = time.perf_counter()
+        local.connection.request("GET", "/recommend?" + urlencode({"category": cate_name, "user": user, "n": n}))
+        response = local.connection.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status} for user {user}")
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(request, users))
+
+# ==== Thống kê LRU cache của category từ endpoint /stats của server ====
+def fetch_cache_stats(url, cate_name):
+    target = urlparse(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+    try:
+        connection.request("GET", "/stats")
+        return json.loads(connection.getresponse().read())[cate_name]
+    finally:
+        connection.close()
+
+# Hit rate của LRU cache trong khoảng giữa 2 lần lấy thống kê (before, after là dict hits/misses/...)
+def cache_delta(before, after):
+    hits, misses = after["hits"] - before["hits"], after["misses"] - before["misses"]
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "currsize": after["currsize"], "maxsize": after["maxsize"]}
+
+# Gọi thẳng HybridRecommender trong process (không có chi phí HTTP), để tách độ trễ của model và của server
+def run_in_process(recommender, users, n=10):
+    latencies = []
+    for user in users:
+        start = time.perf_counter()
+        recommender.recommend(user, n)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def summarize(latencies, seconds):
+    latencies_ms = np.asarray(latencies) * 1000
+    return {"requests": len(latencies_ms), "seconds": round(seconds, 3),
+            "qps": round(len(latencies_ms) / seconds, 1) if seconds else 0.0,
+            "mean_ms": round(float(latencies_ms.mean()), 3),
+            **{f"p{q}_ms": round(float(np.percentile(latencies_ms, q)), 3) for q in (50, 90, 99)},
+            "max_ms": round(float(latencies_ms.max()), 3)}
+
+# ==== Gọi script từ dòng lệnh ====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default="../data/output", help="Thư mục output (để lấy danh sách user)")
+    parser.add_argument("--category", required=True, help="Tên category")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Địa chỉ server của app.py")
+    parser.add_argument("--in_process", action="store_true", help="Gọi HybridRecommender trực tiếp, không qua HTTP")
+    parser.add_argument("--policy", default="blend", choices=POLICIES, help="Policy khi chạy --in_process")
+    parser.add_argument("--requests", type=int, default=10000, help="Tổng số request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Số request đồng thời (HTTP)")
+    parser.add_argument("--n", type=int, default=10, help="Số item mỗi request")
+    parser.add_argument("--zipf", type=float, default=1.2, help="Tham số Zipf của phân phối user (<= 1: đều)")
+    parser.add_argument("--cold_fraction", type=float, default=0.05, help="Tỉ lệ request của user mới")
+    parser.add_argument("--warmup", type=int, default=200, help="Số request chạy trước, không tính vào kết quả")
+    parser.add_argument("--report", default=None, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    category_dir = os.path.join(args.output_dir, args.category)
+    users = sample_users(category_dir, args.category, args.warmup + args.requests, args.zipf, args.cold_fraction)
+    warmup_users, users = users[:args.warmup], users[args.warmup:]
+
+    if args.in_process:
+        recommender = HybridRecommender(category_dir, args.category, args.policy)
+        run_in_process(recommender, warmup_users, args.n)
+        cache_before = recommender.cache_info()._asdict()
+        start = time.perf_counter()
+        latencies = run_in_process(recommender, users, args.n)
+        seconds = time.perf_counter() - start
+        cache_after = recommender.cache_info()._asdict()
+    else:
+        run_http(args.url, args.category, warmup_users, args.n, args.concurrency)
+        cache_before = fetch_cache_stats(args.url, args.category)
+        start = time.perf_counter()
+        latencies = run_http(args.url, args.category, users, args.n, args.concurrency)
+        seconds = time.perf_counter() - start
+        cache_after = fetch_cache_stats(args.url, args.category)
+    result = summarize(latencies, seconds)
+    result.update({"mode": "in_process" if args.in_process else "http", "category": args.category,
+                   "concurrency": 1 if args.in_process else args.concurrency, "n": args.n, "zipf": args.zipf})
+    # Chỉ tính các request đo (không gồm warmup); khi chạy HTTP, request của client khác cũng được tính
+    result["cache"] = cache_delta(cache_before, cache_after)
+
+    print(f"⏱️  {result['requests']} requests in {result['seconds']}s: {result['qps']} QPS, "
+          f"p50={result['p50_ms']}ms, p99={result['p99_ms']}ms, max={result['max_ms']}ms, "
+          f"cache hit rate={result['cache']['hit_rate']:.1%}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(result, f, indent=2)
+
+# === RUN ===: python load_test.py --output_dir ../data/output --category Gift_Cards --url http://127.0.0.1:8000 --requests 10000 --concurrency 8
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import functools
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "preprocessing"))
+from candidates import SERVE_MANIFEST
+from id_dictionary import IdDictionary
+from similarity import load_csr
+
+POLICIES = ["switch", "blend"]
+
+# ==== Hybrid recommender cho một category, đọc artifact của candidates.py qua memory-map ====
+# Chọn model theo số tương tác d của user trong train:
+#   switch: d >= min_interactions và có candidate item-KNN => item-KNN, ngược lại => phổ biến
+#   blend : điểm = w * KNN + (1 - w) * phổ biến, w = d / (d + shrink), mỗi điểm được chia cho giá trị lớn nhất
+# User không có trong train (cold-start) luôn nhận item phổ biến. Item user đã tương tác bị loại.
+# Kết quả của cache_size lời gọi gần nhất được giữ trong LRU cache (functools.lru_cache, an toàn với thread).
+class HybridRecommender:
+    def __init__(self, category_dir, cate_name, policy="blend", min_interactions=5, shrink=10.0, cache_size=10000):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, got {policy!r}")
+        with open(os.path.join(category_dir, SERVE_MANIFEST.format(cate=cate_name)), "r") as f:
+            self.manifest = json.load(f)
+        self.category = cate_name
+        self.policy, self.min_interactions, self.shrink = policy, min_interactions, shrink
+
+        files = {name: os.path.join(category_dir, file_name) for name, file_name in self.manifest["files"].items()}
+        self.knn_indices = np.load(files["knn_indices"], mmap_mode="r")
+        self.knn_scores = np.load(files["knn_scores"], mmap_mode="r")
+        self.popularity = np.load(files["popularity"], mmap_mode="r")
+        self.popular = np.load(files["popular"], mmap_mode="r")
+        self.max_popularity = float(self.popularity[self.popular[0]]) if len(self.popular) else 1.0
+        matrix = load_csr(category_dir, cate_name, self.manifest["num_items"])
+        self.indptr, self.indices = matrix.indptr, matrix.indices
+
+        self.user_dict, self.item_dict = [IdDictionary.load(os.path.join(category_dir, self.manifest["id_dicts"][kind]))
+                                          for kind in ("user", "item")]
+        self._recommend_cached = functools.lru_cache(maxsize=cache_size)(self._recommend)
+
+    # ==== Top-n cho user (ID gốc): danh sách (item ID gốc, điểm) và model đã dùng ====
+    def recommend(self, user_id, n=10):
+        return self._recommend_cached(user_id, n)
+
+    def cache_info(self):
+        return self._recommend_cached.cache_info()
+
+    def _recommend(self, user_id, n):
+        user = int(self.user_dict.lookup([user_id])[0])
+        items, scores, model = self.recommend_ids(user, n)
+        item_ids = [item.decode() for item in self.item_dict.reverse(items)] if len(items) else []
+        return tuple(zip(item_ids, scores.tolist())), model
+
+    # ==== Top-n theo ID số (user = -1 hoặc ngoài train => cold-start) ====
+    def recommend_ids(self, user, n=10):
+        if user < 0 or user >= len(self.indptr) - 1:
+            return self._popular(n, np.empty(0, dtype=np.int32)) + ("popular",)
+
+        seen = np.asarray(self.indices[self.indptr[user]:self.indptr[user + 1]])
+        knn_items = np.asarray(self.knn_indices[user])
+        valid = knn_items >= 0
+        knn_items, knn_scores = knn_items[valid], np.asarray(self.knn_scores[user])[valid]
+        if not len(knn_items):
+            return self._popular(n, seen) + ("popular",)
+
+        if self.policy == "switch":
+            if len(seen) < self.min_interactions:
+                return self._popular(n, seen) + ("popular",)
+            if len(knn_items) >= n:
+                return knn_items[:n], knn_scores[:n], "itemknn"
+            # Không đủ candidate item-KNN: bổ sung item phổ biến xếp sau
+            items, scores = self._popular(n, np.concatenate([seen, knn_items]))
+            return (np.concatenate([knn_items, items])[:n], np.concatenate([knn_scores, scores])[:n],
+                    "itemknn+popular")
+
+        weight = len(seen) / (len(seen) + self.shrink)
+        popular_items, _ = self._popular(n, seen)
+        items = np.union1d(knn_items, popular_items)
+        knn_part = np.zeros(len(items), dtype=np.float32)
+        knn_part[np.searchsorted(items, knn_items)] = knn_scores / knn_scores[0]
+        popular_part = np.asarray(self.popularity[items]) / self.max_popularity
+        scores = (weight * knn_part + (1 - weight) * popular_part).astype(np.float32)
+        top = np.lexsort((items, -scores))[:n]
+        return items[top], scores[top], "blend"
+
+    # ==== n item phổ biến nhất mà user chưa tương tác ====
+    def _popular(self, n, exclude):
+        popular = np.asarray(self.popular[:n + len(exclude)])
+        items = popular[~np.isin(popular, exclude)][:n]
+        return items, np.asarray(self.popularity[items], dtype=np.float32) / self.max_popularity
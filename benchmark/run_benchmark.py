@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import multiprocessing as mp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "preprocessing"))
+sys.path.insert(0, os.path.join(ROOT, "helper"))
+
+import pre_process
+import meta
+import review
+from instrumentation import PeakRSSMonitor
+from synthetic_data import generate_category
+
+STAGES = ["load_csv_file", "load_interactions", "build_id_maps", "convert_dataframe", "split_train_test", "generate_negative_samples",
+          "save_output_per_category", "process_metadata", "process_metadata_numeric_prices", "process_reviews"]
+# Category phụ chỉ có giá dạng số / null (không có chuỗi nào trong batch giá), để mỗi lần chạy đều đi qua nhánh đó
+NUMERIC_PRICE_CATEGORY = "Synthetic_Numeric_Price"
+NUMERIC_PRICE_INTERACTIONS = 10_000
+
+# ==== Chuẩn bị input cho stage (không tính giờ) rồi chạy stage, trả về (số dòng ra) ====
+def run_stage(stage, data_root, work_dir, cate_name):
+    pre_input = os.path.join(data_root, "pre")
+    helper_input = os.path.join(data_root, "input")
+    state = {}
+
+    def prepare(upto):
+        if upto in ("load_csv_file", "load_interactions"):
+            return
+        state["df"] = pre_process.load_csv_file(pre_input, cate_name)
+        if upto == "build_id_maps":
+            return
+        state["maps"] = pre_process.build_id_maps([state["df"]])
+        if upto == "convert_dataframe":
+            return
+        state["converted"] = pre_process.convert_dataframe(state["df"], *state["maps"])
+        if upto == "split_train_test":
+            return
+        state["split"] = pre_process.split_train_test(state["converted"])
+        if upto == "generate_negative_samples":
+            return
+        state["negatives"] = pre_process.generate_negative_samples(*state["split"], len(state["maps"][1]))
+
+    stages = {
+        "load_csv_file": lambda: len(pre_process.load_csv_file(pre_input, cate_name)),
+        "load_interactions": lambda: len(pre_process.load_interactions(pre_input, cate_name)[0]),
+        "build_id_maps": lambda: len(pre_process.build_id_maps([state["df"]])[0]),
+        "convert_dataframe": lambda: len(pre_process.convert_dataframe(state["df"], *state["maps"])),
+        "split_train_test": lambda: sum(map(len, pre_process.split_train_test(state["converted"]))),
+        "generate_negative_samples": lambda: len(pre_process.generate_negative_samples(
+            *state["split"], len(state["maps"][1]))),
+        "save_output_per_category": lambda: pre_process.save_output_per_category(
+            cate_name, *state["split"], state["negatives"], os.path.join(work_dir, "pre_output")) or
+            len(state["split"][0]),
+        "process_metadata": lambda: meta.process_metadata(
+            cate_name, helper_input, os.path.join(work_dir, "helper_output")).count,
+        "process_metadata_numeric_prices": lambda: meta.process_metadata(
+            NUMERIC_PRICE_CATEGORY, helper_input, os.path.join(work_dir, "helper_output")).count,
+        "process_reviews": lambda: review.process_reviews(cate_name, helper_input,
+                                                          os.path.join(work_dir, "helper_output"))[1],
+    }
+
+    if stage in STAGES[:7]:
+        prepare(stage)
+    with PeakRSSMonitor(interval=0.01) as monitor:
+        start, cpu_start = time.perf_counter(), time.process_time()
+        rows = stages[stage]()
+        seconds, cpu_seconds = time.perf_counter() - start, time.process_time() - cpu_start
+    return {"seconds": seconds, "cpu_seconds": cpu_seconds, "rows": rows,
+            "peak_rss_mb": monitor.peak / 2 ** 20, "rss_delta_mb": (monitor.peak - monitor.baseline) / 2 ** 20}
+
+def _stage_worker(queue, *args):
+    try:
+        queue.put(run_stage(*args))
+    except Exception as e:
+        queue.put({"error": repr(e)})
+
+# ==== Chạy từng stage trong một process riêng để RSS đỉnh không bị lẫn giữa các stage ====
+def run_benchmark(data_root, work_dir, cate_name, stages=STAGES, repeat=1):
+    context = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+    results = {}
+    for stage in stages:
+        runs = []
+        for _ in range(repeat):
+            queue = context.Queue()
+            process = context.Process(target=_stage_worker, args=(queue, stage, data_root, work_dir, cate_name))
+            process.start()
+            runs.append(queue.get())
+            process.join()
+        ok_runs = [r for r in runs if "error" not in r]
+        results[stage] = min(ok_runs, key=lambda r: r["seconds"]) if ok_runs else runs[0]
+        status = results[stage].get("error") or f"{results[stage]['seconds']:.3f}s, " \
+                                                f"peak {results[stage]['peak_rss_mb']:.0f} MB"
+        print(f"⏱️  {stage:<28} {status}")
+    return results
+
+# ==== So sánh với file kết quả baseline, trả về danh sách stage chậm hơn ngưỡng ====
+def compare(results, baseline, threshold=0.1):
+    regressions = []
+    print(f"\n{'Stage':<28}{'Baseline (s)':>14}{'Current (s)':>14}{'Ratio':>8}{'Peak MB':>10}{'Base MB':>10}")
+    for stage, current in results["stages"].items():
+        base = baseline["stages"].get(stage)
+        if not base or "error" in base or "error" in current:
+            continue
+        ratio = current["seconds"] / base["seconds"] if base["seconds"] else float("inf")
+        flag = " ⚠️" if ratio > 1 + threshold else ""
+        print(f"{stage:<28}{base['seconds']:>14.3f}{current['seconds']:>14.3f}{ratio:>8.2f}"
+              f"{current['peak_rss_mb']:>10.0f}{base['peak_rss_mb']:>10.0f}{flag}")
+        if flag:
+            regressions.append(stage)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interactions", type=int, default=10_000, help="Số tương tác giả lập (10k .. 100M)")
+    parser.add_argument("--users", type=int, default=None)
+    parser.add_argument("--items", type=int, default=None)
+    parser.add_argument("--item_exponent", type=float, default=1.0, help="Số mũ Zipf cho độ phổ biến item")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES, help="Các stage cần đo")
+    parser.add_argument("--repeat", type=int, default=1, help="Số lần chạy mỗi stage (lấy lần nhanh nhất)")
+    parser.add_argument("--data_root", default=None, help="Thư mục dữ liệu giả lập (mặc định trong work_dir)")
+    parser.add_argument("--work_dir", default="../data/benchmark", help="Thư mục làm việc")
+    parser.add_argument("--output", default="benchmark_results.json", help="File kết quả JSON")
+    parser.add_argument("--baseline", default=None, help="File kết quả để so sánh")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Ngưỡng chậm hơn baseline bị coi là regression")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    cate_name = "Synthetic"
+    data_root = args.data_root or os.path.join(args.work_dir, f"data_{args.interactions}")
+    if not os.path.exists(os.path.join(data_root, "pre", cate_name, f"{cate_name}.csv")):
+        print(f"🔄 Generating {args.interactions} synthetic interactions in {data_root}...")
+        generate_category(data_root, cate_name, args.interactions, args.users, args.items,
+                          args.item_exponent, seed=args.seed)
+    if not os.path.exists(os.path.join(data_root, "input", "meta", f"meta_{NUMERIC_PRICE_CATEGORY}.jsonl")):
+        generate_category(data_root, NUMERIC_PRICE_CATEGORY, min(args.interactions, NUMERIC_PRICE_INTERACTIONS),
+                          seed=args.seed, string_prices=False)
+
+    run_dir = os.path.join(args.work_dir, "run")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    stages = run_benchmark(data_root, run_dir, cate_name, args.stages, args.repeat)
+
+    results = {
+        "params": {"interactions": args.interactions, "users": args.users, "items": args.items,
+                   "item_exponent": args.item_exponent, "seed": args.seed, "repeat": args.repeat},
+        "env": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "stages": stages,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to {args.output}")
+
+    failed = [stage for stage, result in stages.items() if "error" in result]
+    if failed:
+        print(f"❌ Failed stages: {', '.join(failed)}")
+        sys.exit(1)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"❌ Slower than baseline: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,113 @@
+import os
+import json
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+CHUNK_SIZE = 1_000_000
+WORDS = np.array(["great", "works", "quality", "price", "love", "cheap", "small", "fits", "broke", "perfect",
+                  "color", "size", "gift", "daughter", "returned", "smell", "easy", "battery", "soft", "recommend"])
+
+# ==== ID giả lập theo đúng định dạng Amazon Reviews 2023 ====
+def make_user_ids(indices):
+    return np.char.add("AG", np.char.zfill(indices.astype(str), 26))
+
+def make_item_ids(indices):
+    return np.char.add("B0", np.char.zfill(indices.astype(str), 8))
+
+# ==== Phân phối Zipf trên [0, n): xác suất item thứ k tỉ lệ với 1 / (k + 1)^exponent ====
+def zipf_sampler(n, exponent, rng):
+    cdf = np.cumsum(1.0 / np.arange(1, n + 1) ** exponent)
+    cdf /= cdf[-1]
+    # Hoán vị để item phổ biến không luôn có ID nhỏ nhất
+    permutation = rng.permutation(n)
+    return lambda size: permutation[np.minimum(np.searchsorted(cdf, rng.random(size)), n - 1)]
+
+def random_text(rng, num_words):
+    return " ".join(WORDS[rng.integers(0, len(WORDS), num_words)])
+
+# ==== Sinh dữ liệu giả lập cho một category ====
+# Ghi theo layout của helper/ (input/train, input/meta, input/review) và của preprocessing/ (pre/<cate>/<cate>.csv).
+# string_prices=False: giá chỉ là số hoặc null (trường hợp phổ biến trong file meta gốc, mọi batch không có chuỗi).
+def generate_category(root, cate_name, num_interactions, num_users=None, num_items=None,
+                      item_exponent=1.0, user_exponent=0.6, review_fraction=1.0, seed=42, string_prices=True):
+    rng = np.random.default_rng(seed)
+    num_users = num_users or max(num_interactions // 8, 10)
+    num_items = num_items or max(num_interactions // 20, 10)
+
+    input_folder = os.path.join(root, "input")
+    for subfolder in ["train", "meta", "review"]:
+        os.makedirs(os.path.join(input_folder, subfolder), exist_ok=True)
+    train_file = os.path.join(input_folder, "train", f"{cate_name}.csv")
+    meta_file = os.path.join(input_folder, "meta", f"meta_{cate_name}.jsonl")
+    review_file = os.path.join(input_folder, "review", f"{cate_name}.jsonl")
+
+    sample_items = zipf_sampler(num_items, item_exponent, rng)
+    sample_users = zipf_sampler(num_users, user_exponent, rng)
+
+    # Interaction + review
+    with open(train_file, "w") as train_f, open(review_file, "w") as review_f:
+        train_f.write("user_id,parent_asin,rating,timestamp\n")
+        for start in tqdm(range(0, num_interactions, CHUNK_SIZE), desc=f"Generating interactions {cate_name}"):
+            size = min(CHUNK_SIZE, num_interactions - start)
+            users = make_user_ids(sample_users(size))
+            items = make_item_ids(sample_items(size))
+            ratings = rng.integers(1, 6, size).astype(float)
+            timestamps = 1_500_000_000_000 + rng.integers(0, 200_000_000_000, size)
+            pd.DataFrame({"user_id": users, "parent_asin": items, "rating": ratings, "timestamp": timestamps}) \
+                .to_csv(train_f, header=False, index=False)
+
+            for k in np.flatnonzero(rng.random(size) < review_fraction):
+                review_f.write(json.dumps({
+                    "rating": ratings[k], "title": random_text(rng, 3), "text": random_text(rng, 20),
+                    "images": [], "asin": items[k], "parent_asin": items[k], "user_id": users[k],
+                    "timestamp": int(timestamps[k]), "helpful_vote": int(rng.integers(0, 5)),
+                    "verified_purchase": bool(rng.random() < 0.9),
+                }) + "\n")
+
+    # Meta: mọi item trong train + 10% item không có tương tác (như file meta gốc)
+    prices = [None, "from 12.99", "N/A"] if string_prices else [None]
+    with open(meta_file, "w") as meta_f:
+        for k in tqdm(range(int(num_items * 1.1)), desc=f"Generating meta {cate_name}"):
+            price = prices[k % len(prices)] if k % 5 == 0 else round(float(rng.lognormal(3, 1)), 2)
+            meta_f.write(json.dumps({
+                "main_category": cate_name.replace("_", " "), "title": random_text(rng, 6) if k % 7 else "",
+                "average_rating": round(float(rng.uniform(1, 5)), 1), "rating_number": int(rng.integers(0, 5000)),
+                "features": [random_text(rng, 5)], "description": [random_text(rng, 12)], "price": price,
+                "images": [{"thumb": "t.jpg", "large": "l.jpg", "variant": "MAIN", "hi_res": None}] if k % 4 else [],
+                "videos": [], "store": f"Store {k % 97}", "categories": [], "details": {},
+                "parent_asin": str(make_item_ids(np.array([k]))[0]), "bought_together": None,
+            }) + "\n")
+
+    # Layout của preprocessing/pre_process.py: <input_dir>/<cate>/<cate>.csv
+    pre_dir = os.path.join(root, "pre", cate_name)
+    os.makedirs(pre_dir, exist_ok=True)
+    pre_file = os.path.join(pre_dir, f"{cate_name}.csv")
+    if os.path.exists(pre_file):
+        os.remove(pre_file)
+    try:
+        os.link(train_file, pre_file)
+    except OSError:
+        shutil.copyfile(train_file, pre_file)
+
+    return {"interactions": num_interactions, "users": num_users, "items": num_items}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default="../data/synthetic", help="Thư mục ghi dữ liệu giả lập")
+    parser.add_argument("--category", default="Synthetic", help="Tên category giả lập")
+    parser.add_argument("--interactions", type=int, default=10_000, help="Số tương tác (10k .. 100M)")
+    parser.add_argument("--users", type=int, default=None, help="Số user (mặc định interactions / 8)")
+    parser.add_argument("--items", type=int, default=None, help="Số item (mặc định interactions / 20)")
+    parser.add_argument("--item_exponent", type=float, default=1.0, help="Số mũ Zipf cho độ phổ biến item")
+    parser.add_argument("--review_fraction", type=float, default=1.0, help="Tỉ lệ tương tác có review")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--numeric_prices", action="store_true", help="Chỉ sinh giá dạng số hoặc null")
+    args = parser.parse_args()
+
+    info = generate_category(args.root, args.category, args.interactions, args.users, args.items,
+                             args.item_exponent, review_fraction=args.review_fraction, seed=args.seed,
+                             string_prices=not args.numeric_prices)
+    print(f"✅ Generated {info}")
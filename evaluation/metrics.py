@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+
+# Dùng chung định dạng output với preprocessing/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "preprocessing"))
+from binary_format import MANIFEST_FILE, build_candidate_matrix, load_binary_output, read_text_output
+from similarity import TOPK_MANIFEST, build_interaction_matrix, load_topk
+
+DEFAULT_KS = [5, 10, 20]
+BATCH_SIZE = 4096
+# Số user test mỗi shard cố định => kết quả không phụ thuộc số worker
+SHARD_SIZE = 100_000
+
+# ==== Đọc dữ liệu đánh giá của một category ====
+# Trả về (train (n, 2), users (số user test,), candidates (số user test, 1 + num_negatives)):
+# cột 0 của candidates là item dương, các cột sau là negative, -1 là ô đệm.
+def load_candidates(category_dir, cate_name, num_negatives=99):
+    if os.path.exists(os.path.join(category_dir, MANIFEST_FILE.format(cate=cate_name))):
+        _, arrays = load_binary_output(category_dir, cate_name)
+        return arrays["train"], arrays["test"][:, 0], arrays["negative"]
+    train_data, test_data, test_negative = read_text_output(category_dir, cate_name, num_negatives)
+    return train_data, test_data[:, 0], build_candidate_matrix(test_data, test_negative)
+
+# ==== Rank của item dương trong từng dòng điểm ====
+# scores: (n, C) với cột 0 là item dương; valid: (n, C) bool, ô đệm bị bỏ qua.
+# Hoà điểm được tính bất lợi cho item dương (model cho mọi item cùng điểm sẽ có HR = 0).
+def positive_ranks(scores, valid):
+    scores = np.asarray(scores, dtype=np.float64)
+    beats = (scores[:, 1:] >= scores[:, :1]) & valid[:, 1:]
+    return beats.sum(axis=1)
+
+# ==== HR@K và NDCG@K từ rank (0 = đứng đầu), cho nhiều K trong một lượt ====
+def hit_ndcg(ranks, ks=DEFAULT_KS):
+    ranks = np.asarray(ranks)
+    gains = 1.0 / np.log2(ranks + 2.0)
+    result = {}
+    for k in ks:
+        hit = ranks < k
+        result[f"HR@{k}"] = float(hit.mean()) if len(ranks) else 0.0
+        result[f"NDCG@{k}"] = float(np.where(hit, gains, 0).mean()) if len(ranks) else 0.0
+    return result
+
+# ==== Tính rank cho một đoạn user, chấm điểm theo batch ====
+# score_fn(users (b,), items (b, C)) -> điểm (b, C); ô đệm được truyền vào dưới dạng item 0 và bị bỏ qua.
+def rank_users(score_fn, users, candidates, batch_size=BATCH_SIZE):
+    ranks = np.empty(len(users), dtype=np.int32)
+    for start in range(0, len(users), batch_size):
+        batch_candidates = np.asarray(candidates[start:start + batch_size])
+        valid = batch_candidates >= 0
+        scores = score_fn(np.asarray(users[start:start + batch_size]), np.where(valid, batch_candidates, 0))
+        ranks[start:start + len(batch_candidates)] = positive_ranks(scores, valid)
+    return ranks
+
+# ==== Worker: nhận score_fn và candidate một lần qua initializer ====
+_shared_eval = None
+
+def _init_worker(score_fn, users, candidates, batch_size):
+    global _shared_eval
+    _shared_eval = (score_fn, users, candidates, batch_size)
+
+def _rank_shard_task(bounds):
+    score_fn, users, candidates, batch_size = _shared_eval
+    start, end = bounds
+    return rank_users(score_fn, users[start:end], candidates[start:end], batch_size)
+
+# ==== Đánh giá một model: rank của item dương cho mọi user test rồi HR@K / NDCG@K ====
+# workers > 1: chia user thành các shard SHARD_SIZE và chấm điểm song song (score_fn phải pickle được).
+# Trả về (metrics dict, ranks int32 theo thứ tự user test).
+def evaluate(score_fn, users, candidates, ks=DEFAULT_KS, batch_size=BATCH_SIZE, workers=1, desc="Evaluating"):
+    shards = [(start, min(start + SHARD_SIZE, len(users))) for start in range(0, len(users), SHARD_SIZE)]
+    initargs = (score_fn, users, candidates, batch_size)
+    if workers > 1 and len(shards) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            results = list(tqdm(executor.map(_rank_shard_task, shards), total=len(shards), desc=desc))
+    else:
+        _init_worker(*initargs)
+        results = [_rank_shard_task(shard) for shard in tqdm(shards, desc=desc)]
+    ranks = np.concatenate(results) if results else np.empty(0, dtype=np.int32)
+    metrics = hit_ndcg(ranks, ks)
+    metrics["users"] = len(ranks)
+    return metrics, ranks
+
+# ==== Model đơn giản dùng làm baseline ====
+# Điểm = số lần item xuất hiện trong train
+class PopularityScorer:
+    def __init__(self, train_data, num_items):
+        self.popularity = np.bincount(np.asarray(train_data)[:, 1], minlength=num_items).astype(np.float32)
+
+    def __call__(self, users, items):
+        return self.popularity[items]
+
+# Điểm ngẫu nhiên (HR@K kỳ vọng ≈ K / số candidate)
+class RandomScorer:
+    def __init__(self, seed=42):
+        self.seed = seed
+
+    def __call__(self, users, items):
+        rng = np.random.default_rng([self.seed, int(users[0]) if len(users) else 0])
+        return rng.random(items.shape)
+
+# Item-KNN từ top-K láng giềng của similarity.py: điểm(u, i) = tổng độ tương đồng giữa i và các láng giềng
+# của i mà u đã tương tác trong train.
+class ItemKNNScorer:
+    def __init__(self, train_data, num_users, num_items, neighbor_indices, neighbor_scores):
+        matrix = build_interaction_matrix(train_data, num_users, num_items)
+        rows = np.repeat(np.arange(num_users, dtype=np.int64), np.diff(matrix.indptr))
+        self.keys = rows * num_items + matrix.indices  # đã sắp tăng dần (CSR)
+        self.num_items = num_items
+        self.neighbor_indices = neighbor_indices
+        self.neighbor_scores = neighbor_scores
+
+    def __call__(self, users, items):
+        # Item không có trong ma trận tương đồng (không xuất hiện trong train) không có láng giềng
+        known = (items < len(self.neighbor_indices))[:, :, None]
+        items = np.where(known[:, :, 0], items, 0).ravel()
+        neighbors = np.asarray(self.neighbor_indices[items]).reshape(*known.shape[:2], -1)
+        weights = np.asarray(self.neighbor_scores[items]).reshape(*known.shape[:2], -1) * known
+        keys = users.astype(np.int64)[:, None, None] * self.num_items + neighbors
+        pos = np.minimum(np.searchsorted(self.keys, keys), max(len(self.keys) - 1, 0))
+        seen = (neighbors >= 0) & (self.keys[pos] == keys) if len(self.keys) else np.zeros(keys.shape, bool)
+        return (weights * seen).sum(axis=2)
+
+def build_scorer(model, category_dir, cate_name, train_data, num_users, num_items):
+    if model == "popularity":
+        return PopularityScorer(train_data, num_items)
+    if model == "random":
+        return RandomScorer()
+    if not os.path.exists(os.path.join(category_dir, TOPK_MANIFEST.format(cate=cate_name, kind="item"))):
+        raise FileNotFoundError(f"Run preprocessing/similarity.py for {cate_name} before evaluating itemknn")
+    _, arrays = load_topk(category_dir, cate_name, "item")
+    return ItemKNNScorer(train_data, num_users, num_items, arrays["indices"], arrays["scores"])
+
+# ==== Gọi script từ dòng lệnh ====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default="../data/output", help="Thư mục output của pre_process.py")
+    parser.add_argument("--categories", nargs='+', required=True, help="Danh sách tên category")
+    parser.add_argument("--models", nargs='+', default=["popularity"], choices=["popularity", "random", "itemknn"],
+                        help="Các model cần đánh giá")
+    parser.add_argument("--ks", nargs='+', type=int, default=DEFAULT_KS, help="Các giá trị K")
+    parser.add_argument("--num_negatives", type=int, default=99, help="Số negative tối đa mỗi dòng trong file text")
+    parser.add_argument("--batch_size", type=int, default=BATCH_SIZE, help="Số user mỗi batch chấm điểm")
+    parser.add_argument("--workers", type=int, default=1, help="Số process chấm điểm song song")
+    args = parser.parse_args()
+
+    for cate_name in args.categories:
+        category_dir = os.path.join(args.output_dir, cate_name)
+        train_data, users, candidates = load_candidates(category_dir, cate_name, args.num_negatives)
+        num_users = int(max(np.max(train_data[:, 0], initial=-1), np.max(users, initial=-1))) + 1
+        num_items = int(max(np.max(train_data[:, 1], initial=-1), np.max(candidates, initial=-1))) + 1
+
+        results = {}
+        for model in args.models:
+            score_fn = build_scorer(model, category_dir, cate_name, train_data, num_users, num_items)
+            metrics, _ = evaluate(score_fn, users, candidates, args.ks, args.batch_size, args.workers,
+                                  desc=f"Evaluating {model} {cate_name}")
+            results[model] = metrics
+            print(f"📈 {cate_name} {model}: " + ", ".join(f"{name}={value:.4f}" for name, value in metrics.items()
+                                                        if name != "users") + f" ({metrics['users']} users)")
+
+        with open(os.path.join(category_dir, f"{cate_name}.eval.json"), "w") as f:
+            json.dump(results, f, indent=2)
+
+# === RUN ===: python metrics.py --output_dir ../data/output --categories Gift_Cards --models popularity itemknn --ks 5 10 20
@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import hashlib
+
+CACHE_FILE = ".build_cache.json"
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def hash_file(path):
+    """
+    BLAKE2b content hash of a file, read in HASH_CHUNK_SIZE chunks.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildCache:
+    """
+    Fingerprints of the inputs and parameters each build step (e.g. a category, or a stage of a category)
+    was last built from, stored as JSON in the output folder.
+
+    A step is up to date when the content hashes of its inputs, its parameters and the list of its outputs
+    match the last successful build and all outputs still exist. File hashes are cached by (size, mtime),
+    so unchanged inputs are not re-read on every run.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.steps = {}
+        self.files = {}
+        if os.path.exists(cache_file):
+            with open(cache_file, "r") as f:
+                data = json.load(f)
+            self.steps, self.files = data.get("steps", {}), data.get("files", {})
+
+    @classmethod
+    def for_folder(cls, output_folder):
+        return cls(os.path.join(output_folder, CACHE_FILE))
+
+    def file_hash(self, path):
+        """
+        Content hash of path (None if missing), reusing the cached hash while size and mtime are unchanged.
+        """
+        path = os.path.abspath(path)
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        cached = self.files.get(path)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["hash"]
+        file_hash = hash_file(path)
+        self.files[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": file_hash}
+        return file_hash
+
+    def fingerprint(self, inputs, params):
+        return {"inputs": {os.path.abspath(path): self.file_hash(path) for path in inputs},
+                "params": params}
+
+    def stale_reason(self, key, fingerprint, outputs):
+        """
+        Why step key must be rebuilt ("new", "inputs changed", "params changed", "outputs missing"),
+        or None if it is up to date.
+        """
+        entry = self.steps.get(key)
+        if entry is None:
+            return "new"
+        if entry["inputs"] != fingerprint["inputs"]:
+            return "inputs changed"
+        if entry["params"] != fingerprint["params"]:
+            return "params changed"
+        if sorted(entry["outputs"]) != sorted(os.path.abspath(path) for path in outputs) or \
+                not all(os.path.exists(path) for path in outputs):
+            return "outputs missing"
+        return None
+
+    def check(self, key, inputs, params, outputs, force=False):
+        """
+        Fingerprint step key and return (reason it must be rebuilt or None if up to date, fingerprint).
+        With force=True every step is rebuilt (reason "forced").
+        """
+        fingerprint = self.fingerprint(inputs, params)
+        return ("forced" if force else self.stale_reason(key, fingerprint, outputs)), fingerprint
+
+    def record(self, key, fingerprint, outputs):
+        """
+        Mark step key as built from fingerprint; call after its outputs were written successfully.
+        """
+        self.steps[key] = {**fingerprint, "outputs": sorted(os.path.abspath(path) for path in outputs),
+                           "built": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+    def invalidate(self, key):
+        self.steps.pop(key, None)
+
+    def save(self):
+        folder = os.path.dirname(self.cache_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.cache_file + ".tmp", "w") as f:
+            json.dump({"steps": self.steps, "files": self.files}, f, indent=2)
+        os.replace(self.cache_file + ".tmp", self.cache_file)
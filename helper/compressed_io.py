@@ -0,0 +1,106 @@
+import os
+import io
+import gzip
+
+try:
+    import zstandard
+except ImportError:  # Optional: only needed for .zst files
+    zstandard = None
+
+READ_BUFFER_SIZE = 8 * 1024 * 1024
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+
+MAGIC_BYTES = {
+    b"\x1f\x8b": "gz",
+    b"\x28\xb5\x2f\xfd": "zst",
+}
+EXTENSIONS = {"gz": ".gz", "zst": ".zst"}
+
+
+def resolve_input(path):
+    """
+    Return path if it exists, otherwise the first existing compressed variant (path.gz, path.zst).
+    Lets callers keep using the plain .jsonl/.csv names for compressed dumps.
+    """
+    if os.path.exists(path):
+        return path
+    for extension in EXTENSIONS.values():
+        if os.path.exists(path + extension):
+            return path + extension
+    return path
+
+
+def detect_compression(path):
+    """
+    Detect the compression format of a file from its magic bytes ("gz", "zst" or None).
+    """
+    with open(path, "rb") as f:
+        head = f.read(4)
+    for magic, compression in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError("Reading or writing .zst files requires the 'zstandard' package (pip install zstandard)")
+
+
+def wrap_reader(raw, compression, read_size=READ_BUFFER_SIZE):
+    """
+    Wrap an open binary file in a buffered decompressing reader (compression = "gz", "zst" or None).
+    read_size is the decompressed buffer size (and, for zstd, the compressed read size).
+    """
+    if compression == "gz":
+        stream = gzip.GzipFile(fileobj=raw, mode="rb")
+        stream.myfileobj = raw  # Close the underlying file together with the gzip stream (as gzip.open does)
+    elif compression == "zst":
+        _require_zstandard()
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, read_size=read_size, closefd=True)
+    else:
+        return raw
+    return io.BufferedReader(stream, buffer_size=read_size)
+
+
+def open_input(path, mode="rb"):
+    """
+    Open a plain, gzip or zstd file for streaming reads, detecting the format automatically.
+
+    :param path: File path; path.gz / path.zst are tried if path does not exist.
+    :param mode: "rb" for bytes or "r" for UTF-8 text.
+    """
+    path = resolve_input(path)
+    compression = detect_compression(path)
+    stream = wrap_reader(open(path, "rb", buffering=READ_BUFFER_SIZE), compression)
+    if mode == "r":
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return stream
+
+
+def output_path(path, compression=None):
+    """
+    Append the extension of the output compression ("gz", "zst" or None) to path.
+    """
+    return path + EXTENSIONS[compression] if compression else path
+
+
+def open_output(path, mode="wb", compression=None):
+    """
+    Open a file for writing, compressing it with gzip or zstd if requested.
+    The caller passes the final path (see output_path).
+
+    :param mode: "wb" for bytes or "w" for UTF-8 text.
+    """
+    raw = open(path, "wb", buffering=WRITE_BUFFER_SIZE)
+    if compression == "gz":
+        stream = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+        stream.myfileobj = raw
+    elif compression == "zst":
+        _require_zstandard()
+        stream = zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=True)
+    else:
+        stream = raw
+    if mode == "w":
+        return io.TextIOWrapper(stream, encoding="utf-8", write_through=True)
+    return stream
@@ -0,0 +1,278 @@
+import os
+import json
+from array import array
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+from price import parse_prices
+from review import extract_parent_asin
+from compressed_io import open_input, resolve_input
+
+REVIEW_CHUNK_SIZE = 100_000
+
+
+class StringColumnWriter:
+    """
+    Append-only variable-length string column, stored as a raw UTF-8 blob (<name>.bin)
+    plus an int64 offsets array (<name>.offsets.npy) with one more entry than rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.blob = open(path + ".bin", "wb")
+        self.offsets = array("q", [0])
+
+    def extend(self, values):
+        for value in values:
+            data = value.encode("utf-8") if value else b""
+            self.blob.write(data)
+            self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self):
+        self.blob.close()
+        np.save(self.path + ".offsets.npy", np.frombuffer(self.offsets, dtype=np.int64))
+
+
+def read_strings(path, rows=None):
+    """
+    Read a string column written by StringColumnWriter, optionally only the given rows.
+    """
+    offsets = np.load(path + ".offsets.npy", mmap_mode="r")
+    if rows is None:
+        rows = np.arange(len(offsets) - 1)
+    if os.path.getsize(path + ".bin") == 0:
+        return np.array([""] * len(rows), dtype=object)
+    blob = np.memmap(path + ".bin", dtype=np.uint8, mode="r")
+    return np.array([bytes(blob[offsets[r]:offsets[r + 1]]).decode("utf-8") for r in rows], dtype=object)
+
+
+def save_item_index(table_dir, item_codes, num_items):
+    """
+    Save the row ids of a table grouped by item code (_by_item.npy) and the start of each
+    item's group (_item_offsets.npy), so rows of a given parent_asin can be read directly.
+    Rows with item code -1 (item missing from the dictionary) are left out of the index.
+    """
+    rows = np.flatnonzero(item_codes >= 0)
+    by_item = rows[np.argsort(item_codes[rows], kind="stable")]
+    np.save(os.path.join(table_dir, "_by_item.npy"), by_item.astype(np.int64))
+    offsets = np.zeros(num_items + 1, dtype=np.int64)
+    np.cumsum(np.bincount(item_codes[item_codes >= 0], minlength=num_items), out=offsets[1:])
+    np.save(os.path.join(table_dir, "_item_offsets.npy"), offsets)
+
+
+def ingest_category(category_name, input_folder, output_folder):
+    """
+    Join the train CSV, meta JSONL and review JSONL of a category into a columnar dataset,
+    reading each input exactly once. Inputs may be gzip/zstd compressed (detected automatically).
+
+    Layout of output/columnar/<category>/:
+        dict/parent_asin.npy, dict/user_id.npy   sorted string dictionaries; codes index into them
+        interactions/   user, item (codes), rating, timestamp           - one row per train CSV row
+        items/          title, price, average_rating, rating_number,
+                        image_count, has_meta, main_category, store     - one row per item code
+        reviews/        user, item, rating, timestamp, helpful_vote,
+                        verified_purchase, image_count, title, text      - reviews of train items
+        manifest.json   column types and row counts
+
+    Reviews whose user_id is not in the train CSV get user code -1.
+    """
+    train_file = resolve_input(os.path.join(input_folder, "train", f"{category_name}.csv"))
+    meta_file = resolve_input(os.path.join(input_folder, "meta", f"meta_{category_name}.jsonl"))
+    review_file = resolve_input(os.path.join(input_folder, "review", f"{category_name}.jsonl"))
+
+    dataset_dir = os.path.join(output_folder, "columnar", category_name)
+    for subfolder in ["dict", "interactions", "items", "reviews"]:
+        os.makedirs(os.path.join(dataset_dir, subfolder), exist_ok=True)
+
+    manifest = {"category": category_name, "tables": {}}
+
+    # Step 1: Interactions, dictionary-encoded against sorted user/item dictionaries
+    train_df = pd.read_csv(train_file)
+    user_codes, users = pd.factorize(train_df["user_id"], sort=True)
+    item_codes, items = pd.factorize(train_df["parent_asin"], sort=True)
+    item_codes = item_codes.astype(np.int32)
+    num_items = len(items)
+
+    np.save(os.path.join(dataset_dir, "dict", "user_id.npy"), users.to_numpy(dtype=str).astype("S"))
+    np.save(os.path.join(dataset_dir, "dict", "parent_asin.npy"), items.to_numpy(dtype=str).astype("S"))
+
+    interactions_dir = os.path.join(dataset_dir, "interactions")
+    columns = {"user": user_codes.astype(np.int32), "item": item_codes}
+    if "rating" in train_df.columns:
+        columns["rating"] = train_df["rating"].to_numpy(dtype=np.float32)
+    if "timestamp" in train_df.columns:
+        columns["timestamp"] = train_df["timestamp"].to_numpy(dtype=np.int64)
+    for name, values in columns.items():
+        np.save(os.path.join(interactions_dir, f"{name}.npy"), values)
+    save_item_index(interactions_dir, item_codes, num_items)
+    manifest["tables"]["interactions"] = {
+        "rows": len(train_df), "columns": {name: str(values.dtype) for name, values in columns.items()}}
+    del train_df, columns
+
+    asin_to_code = {asin: code for code, asin in enumerate(items)}
+
+    # Step 2: Item attributes from meta, one row per item code
+    raw_prices = np.full(num_items, None, dtype=object)
+    average_rating = np.full(num_items, np.nan, dtype=np.float32)
+    rating_number = np.zeros(num_items, dtype=np.int32)
+    image_count = np.zeros(num_items, dtype=np.int32)
+    has_meta = np.zeros(num_items, dtype=bool)
+    titles, main_categories, stores = [""] * num_items, [""] * num_items, [""] * num_items
+
+    if os.path.exists(meta_file):
+        with open_input(meta_file) as meta_f:
+            for line in tqdm(meta_f, desc=f"Ingesting meta {category_name}"):
+                asin = extract_parent_asin(line)
+                code = asin_to_code.get(asin.decode("utf-8")) if asin else None
+                if code is None:
+                    continue
+                data = json.loads(line)
+                raw_prices[code] = data.get("price")
+                if data.get("average_rating") is not None:
+                    average_rating[code] = data["average_rating"]
+                rating_number[code] = data.get("rating_number") or 0
+                image_count[code] = len(data.get("images") or [])
+                has_meta[code] = True
+                titles[code] = data.get("title") or ""
+                main_categories[code] = data.get("main_category") or ""
+                stores[code] = data.get("store") or ""
+
+    price = parse_prices(raw_prices)[0].astype(np.float32)
+    items_dir = os.path.join(dataset_dir, "items")
+    item_columns = {"price": price, "average_rating": average_rating, "rating_number": rating_number,
+                    "image_count": image_count, "has_meta": has_meta}
+    for name, values in item_columns.items():
+        np.save(os.path.join(items_dir, f"{name}.npy"), values)
+    item_column_types = {name: str(values.dtype) for name, values in item_columns.items()}
+
+    title_writer = StringColumnWriter(os.path.join(items_dir, "title"))
+    title_writer.extend(titles)
+    title_writer.close()
+    item_column_types["title"] = "string"
+
+    for name, values in [("main_category", main_categories), ("store", stores)]:
+        codes, uniques = pd.factorize(pd.Series(values), sort=True)
+        np.save(os.path.join(items_dir, f"{name}.npy"), codes.astype(np.int32))
+        np.save(os.path.join(items_dir, f"{name}.dict.npy"), np.array(uniques, dtype=object).astype(str))
+        item_column_types[name] = "category"
+    manifest["tables"]["items"] = {"rows": num_items, "columns": item_column_types}
+    del raw_prices, titles, main_categories, stores, asin_to_code
+
+    # Step 3: Reviews of train items, encoded in chunks
+    reviews_dir = os.path.join(dataset_dir, "reviews")
+    numeric = {"user": array("i"), "item": array("i"), "rating": array("f"), "timestamp": array("q"),
+               "helpful_vote": array("i"), "verified_purchase": array("b"), "image_count": array("i")}
+    string_writers = {name: StringColumnWriter(os.path.join(reviews_dir, name)) for name in ["title", "text"]}
+    train_asins = {asin.encode("utf-8") for asin in items}
+
+    def flush(chunk):
+        if not chunk:
+            return
+        numeric["user"].extend(users.get_indexer([r.get("user_id") for r in chunk]))
+        numeric["item"].extend(items.get_indexer([r.get("parent_asin") for r in chunk]))
+        numeric["rating"].extend(float(r.get("rating") or 0) for r in chunk)
+        numeric["timestamp"].extend(int(r.get("timestamp") or 0) for r in chunk)
+        numeric["helpful_vote"].extend(int(r.get("helpful_vote") or 0) for r in chunk)
+        numeric["verified_purchase"].extend(bool(r.get("verified_purchase")) for r in chunk)
+        numeric["image_count"].extend(len(r.get("images") or []) for r in chunk)
+        for name, writer in string_writers.items():
+            writer.extend(r.get(name) for r in chunk)
+        chunk.clear()
+
+    if os.path.exists(review_file):
+        chunk = []
+        with open_input(review_file) as review_f:
+            for line in tqdm(review_f, desc=f"Ingesting reviews {category_name}"):
+                if extract_parent_asin(line) in train_asins:
+                    chunk.append(json.loads(line))
+                    if len(chunk) >= REVIEW_CHUNK_SIZE:
+                        flush(chunk)
+        flush(chunk)
+
+    review_types = {"user": np.int32, "item": np.int32, "rating": np.float32, "timestamp": np.int64,
+                    "helpful_vote": np.int32, "verified_purchase": bool, "image_count": np.int32}
+    review_column_types = {}
+    for name, values in numeric.items():
+        column = np.frombuffer(values, dtype=values.typecode).astype(review_types[name])
+        np.save(os.path.join(reviews_dir, f"{name}.npy"), column)
+        review_column_types[name] = str(column.dtype)
+    for name, writer in string_writers.items():
+        writer.close()
+        review_column_types[name] = "string"
+    save_item_index(reviews_dir, np.frombuffer(numeric["item"], dtype=np.int32), num_items)
+    manifest["tables"]["reviews"] = {"rows": len(numeric["item"]), "columns": review_column_types}
+
+    manifest["num_users"], manifest["num_items"] = len(users), num_items
+    with open(os.path.join(dataset_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    print(f"Category {category_name} ingested into {dataset_dir}.\n")
+    return manifest
+
+
+def load_manifest(dataset_dir):
+    with open(os.path.join(dataset_dir, "manifest.json"), "r") as f:
+        return json.load(f)
+
+
+def lookup_codes(dataset_dir, dictionary, values):
+    """
+    Map original string IDs (parent_asin or user_id) to their codes; unknown values map to -1.
+    """
+    keys = np.load(os.path.join(dataset_dir, "dict", f"{dictionary}.npy"), mmap_mode="r")
+    values = np.asarray(values, dtype=str).astype("S")
+    if len(keys) == 0:
+        return np.full(len(values), -1, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+    return np.where(keys[pos] == values, pos, -1)
+
+
+def read_table(dataset_dir, table, columns=None, parent_asins=None):
+    """
+    Read selected columns of a table in a columnar dataset.
+
+    :param table: "interactions", "items" or "reviews".
+    :param columns: Column names to load (default: all). Numeric columns are memory-mapped.
+    :param parent_asins: If given, only rows of these items are read (via the per-item row index).
+    :return: A dict of column name -> array. Category columns are decoded to their string values.
+    """
+    spec = load_manifest(dataset_dir)["tables"][table]
+    table_dir = os.path.join(dataset_dir, table)
+    columns = columns or list(spec["columns"])
+
+    rows = None
+    if parent_asins is not None:
+        codes = lookup_codes(dataset_dir, "parent_asin", parent_asins)
+        codes = np.unique(codes[codes >= 0])
+        if table == "items":
+            rows = codes
+        else:
+            offsets = np.load(os.path.join(table_dir, "_item_offsets.npy"), mmap_mode="r")
+            by_item = np.load(os.path.join(table_dir, "_by_item.npy"), mmap_mode="r")
+            starts, lengths = offsets[codes], offsets[codes + 1] - offsets[codes]
+            positions = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            rows = np.sort(by_item[positions + np.repeat(starts, lengths)])
+
+    result = {}
+    for name in columns:
+        kind = spec["columns"][name]
+        if kind == "string":
+            result[name] = read_strings(os.path.join(table_dir, name), rows)
+            continue
+        values = np.load(os.path.join(table_dir, f"{name}.npy"), mmap_mode="r")
+        values = values if rows is None else values[rows]
+        if kind == "category":
+            values = np.load(os.path.join(table_dir, f"{name}.dict.npy"))[values]
+        result[name] = values
+    return result
+
+
+if __name__ == "__main__":
+    categories = ["Pet_Supplies"]  # Modify as needed
+    input_folder, output_folder = "input", "output"
+
+    for category in categories:
+        ingest_category(category, input_folder, output_folder)
+
+    print(f"Columnar ingest completed.\n")
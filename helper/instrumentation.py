@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import platform
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+RSS_SAMPLE_INTERVAL = 0.05
+PROFILE_TOP_FUNCTIONS = 25
+STAGE_FIELDS = {"stage", "wall_seconds", "cpu_seconds", "rows_in", "rows_out", "bytes_read", "bytes_written",
+                "peak_rss_mb", "rss_delta_mb", "profile", "profile_top"}
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes (/proc/self/statm, or the peak RSS from getrusage elsewhere).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return max_rss(resource.RUSAGE_SELF) if resource else 0
+
+
+def max_rss(who):
+    """
+    Peak RSS in bytes reported by getrusage (who = RUSAGE_SELF or RUSAGE_CHILDREN).
+    """
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss * scale
+
+
+def children_cpu_time():
+    """
+    User + system CPU time of terminated child processes (e.g. process pool workers).
+    """
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def file_size(path):
+    """
+    Size of path in bytes, 0 if it does not exist.
+    """
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+
+class PeakRSSMonitor:
+    """
+    Track the peak RSS of this process while a block runs, sampled by a background thread.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = self.baseline = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+class Stage:
+    """
+    Counters of one stage. The stage body sets rows_in/rows_out and adds bytes via read()/wrote().
+    """
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.rows_in = None
+        self.rows_out = None
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def read(self, *paths):
+        self.bytes_read += sum(file_size(path) for path in paths)
+
+    def wrote(self, *paths):
+        self.bytes_written += sum(file_size(path) for path in paths)
+
+
+class RunReport:
+    """
+    Per-stage wall time, CPU time, rows in/out, bytes read/written and peak memory of one run,
+    saved as a JSON report at the end of the run.
+
+    :param name: Name of the run (script), used in the report and profile file names.
+    :param profile_stage: Run the stage with this name under cProfile; the .prof file is written to
+                          profile_dir and the top functions are added to the stage entry of the report.
+    :param profile_dir: Folder for .prof files (default: current folder).
+    """
+
+    def __init__(self, name, profile_stage=None, profile_dir=None):
+        self.name = name
+        self.profile_stage = profile_stage
+        self.profile_dir = profile_dir or "."
+        self.stages = []
+        self.started = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """
+        Measure the block as stage name; labels (e.g. category=...) are copied into the stage entry.
+        Wall and CPU time are recorded even if the block raises.
+        """
+        stage = Stage(name, labels)
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        cpu_start = time.process_time() + children_cpu_time()
+        start = time.perf_counter()
+        try:
+            with PeakRSSMonitor() as monitor:
+                if profiler:
+                    profiler.enable()
+                try:
+                    yield stage
+                finally:
+                    if profiler:
+                        profiler.disable()
+        finally:
+            entry = {"stage": name, **labels,
+                     "wall_seconds": time.perf_counter() - start,
+                     "cpu_seconds": time.process_time() + children_cpu_time() - cpu_start,
+                     "rows_in": stage.rows_in, "rows_out": stage.rows_out,
+                     "bytes_read": stage.bytes_read, "bytes_written": stage.bytes_written,
+                     "peak_rss_mb": monitor.peak / 2 ** 20,
+                     "rss_delta_mb": (monitor.peak - monitor.baseline) / 2 ** 20}
+            if profiler:
+                entry.update(self._save_profile(profiler, name, labels))
+            self.stages.append(entry)
+
+    def _save_profile(self, profiler, name, labels):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        suffix = ".".join(str(value) for value in labels.values())
+        profile_file = os.path.join(self.profile_dir, ".".join(filter(None, [self.name, suffix, name, "prof"])))
+        profiler.dump_stats(profile_file)
+        stats = pstats.Stats(profiler).sort_stats("cumulative")
+        top = []
+        for (file_name, line, function), (_, calls, _, cumulative, _) in \
+                sorted(stats.stats.items(), key=lambda item: -item[1][3])[:PROFILE_TOP_FUNCTIONS]:
+            top.append({"function": f"{os.path.basename(file_name)}:{line}({function})",
+                        "calls": calls, "cumulative_seconds": cumulative})
+        print(f"🔍 Profile of stage {name} saved to {profile_file}")
+        return {"profile": profile_file, "profile_top": top}
+
+    def extend(self, stages):
+        """
+        Add stage entries recorded by another RunReport (e.g. in a worker process).
+        """
+        self.stages.extend(stages)
+
+    def to_dict(self):
+        peak_children = max_rss(resource.RUSAGE_CHILDREN) if resource else 0
+        return {
+            "run": self.name,
+            "started": self.started,
+            "wall_seconds": time.perf_counter() - self._start,
+            "peak_rss_mb": max([current_rss()] + [s["peak_rss_mb"] * 2 ** 20 for s in self.stages]) / 2 ** 20,
+            "children_peak_rss_mb": peak_children / 2 ** 20,
+            "env": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                    "argv": sys.argv},
+            "stages": self.stages,
+        }
+
+    def print_summary(self):
+        print(f"\n{'Stage':<32}{'Label':<28}{'Wall (s)':>10}{'CPU (s)':>10}{'Rows out':>12}{'MB out':>10}{'Peak MB':>10}")
+        for s in self.stages:
+            label = ",".join(str(s[key]) for key in s if key not in STAGE_FIELDS)[:27]
+            rows_out = "" if s["rows_out"] is None else s["rows_out"]
+            print(f"{s['stage']:<32}{label:<28}{s['wall_seconds']:>10.2f}{s['cpu_seconds']:>10.2f}"
+                  f"{rows_out:>12}{s['bytes_written'] / 2 ** 20:>10.1f}{s['peak_rss_mb']:>10.0f}")
+
+    def save(self, report_file):
+        """
+        Write the report to report_file (JSON) and print a per-stage summary.
+        """
+        report = self.to_dict()
+        folder = os.path.dirname(report_file)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(report_file, "w") as f:
+            json.dump(report, f, indent=2)
+        self.print_summary()
+        print(f"📊 Run report saved to {report_file}")
+        return report
+
+
+def default_report_file(output_folder, name):
+    """
+    output/reports/<name>_<timestamp>.json
+    """
+    return os.path.join(output_folder, "reports", f"{name}_{time.strftime('%Y%m%d_%H%M%S')}.json")
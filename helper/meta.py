@@ -4,118 +4,249 @@ import json
 from tqdm import tqdm
 import copy
 
-def process_metadata(category_name, input_folder, output_folder, unique_users, unique_items, price_summary, type_of_price):
+from price import PriceStats, normalize_prices, save_category_stats, load_category_stats, merge_price_stats
+from compressed_io import open_input, open_output, output_path, resolve_input
+from instrumentation import RunReport, default_report_file
+from build_cache import BuildCache
+from vocabulary import Vocabulary
+
+META_CHUNK_SIZE = 10_000
+
+def stream_metadata(meta_file, train_asins, output_meta, output_filtered, price_stats, category_name, compression=None):
+    """
+    Filter a meta JSONL file against train_asins, writing matching records to output_meta
+    and records with a title and images to output_filtered, one JSON line at a time.
+
+    Missing prices of filtered records depend on the category average, so filtered records
+    are first written to a temporary file and patched in a second streaming pass.
+
+    Prices are parsed in batches of META_CHUNK_SIZE records and accumulated into price_stats.
+    The meta file may be gzip/zstd compressed; outputs are compressed if compression is "gz" or "zst".
+
+    :return: (average price of the category (0 if no record has a valid price), records read, records kept)
+    """
+    tmp_filtered = output_filtered + ".tmp"
+
+    def flush(chunk):
+        normalize_prices(chunk, price_stats)
+        for data in chunk:
+            record = json.dumps(data)
+            out_meta.write(record + "\n")
+            if data.get("title") and data.get("images", []):
+                out_tmp.write(record + "\n")
+        chunk.clear()
+
+    with open_input(meta_file, "r") as meta_f, open_output(output_meta, "w", compression) as out_meta, \
+            open(tmp_filtered, "w") as out_tmp:
+        chunk = []
+        read, kept = 0, 0
+        for line in tqdm(meta_f, desc=f"Processing meta {category_name}"):
+            read += 1
+            data = json.loads(line)
+            if data.get("parent_asin") in train_asins:
+                kept += 1
+                chunk.append(data)
+                if len(chunk) >= META_CHUNK_SIZE:
+                    flush(chunk)
+        flush(chunk)
+
+    average_price = price_stats.mean
+
+    with open(tmp_filtered, "r") as in_tmp, open_output(output_filtered, "w", compression) as out_filtered:
+        for line in in_tmp:
+            if '"price": null' in line:
+                item = json.loads(line)
+                if item.get("price") is None:
+                    item["price"] = average_price
+                    line = json.dumps(item) + "\n"
+            out_filtered.write(line)
+    os.remove(tmp_filtered)
+
+    return average_price, read, kept
+
+
+def filter_metadata(category_name, meta_file, output_folder, output_meta, output_filtered, train_asins, stream,
+                    compression, report):
+    """
+    Filter the meta file of a category against train_asins and save its price stats (filter_meta stage).
+    """
+    price_stats = PriceStats()
+    with report.stage("filter_meta", category=category_name) as stage:
+        stage.read(resolve_input(meta_file))
+        if stream:
+            average_price, stage.rows_in, stage.rows_out = stream_metadata(
+                meta_file, train_asins, output_meta, output_filtered, price_stats, category_name, compression)
+        else:
+            meta_data = []
+            read = 0
+
+            with open_input(meta_file, "r") as meta_f:
+                for line in tqdm(meta_f, desc=f"Processing meta {category_name}"):
+                    read += 1
+                    data = json.loads(line)
+                    parent_asin = data.get("parent_asin")
+
+                    if parent_asin in train_asins:
+                        meta_data.append(data)
+            stage.rows_in, stage.rows_out = read, len(meta_data)
+
+            normalize_prices(meta_data, price_stats)
+            filtered_data = [copy.deepcopy(data) for data in meta_data if data.get("title") and data.get("images", [])]
+            average_price = price_stats.mean
+
+            for item in filtered_data:
+                if item.get("price") is None:
+                    item["price"] = 0 if average_price == 0 else average_price
+
+            with open_output(output_meta, "w", compression) as out_meta:
+                json.dump(meta_data, out_meta, indent=4)
+            with open_output(output_filtered, "w", compression) as out_filtered:
+                json.dump(filtered_data, out_filtered, indent=4)
+
+        save_category_stats(price_stats, output_folder, category_name)
+        stage.wrote(output_meta, output_filtered)
+    return price_stats
+
+
+def metadata_steps(category_name, input_folder, output_folder, stream=False, compression=None):
+    """
+    Inputs, parameters and outputs of the cacheable steps of process_metadata (filter_meta, save_train),
+    keyed by build cache key.
+    """
+    train_file = resolve_input(os.path.join(input_folder, "train", f"{category_name}.csv"))
+    meta_file = resolve_input(os.path.join(input_folder, "meta", f"meta_{category_name}.jsonl"))
+    extension = "jsonl" if stream else "json"
+    return {
+        f"meta/{category_name}/filter_meta": (
+            [train_file, meta_file], {"stream": stream, "compression": compression},
+            [output_path(os.path.join(output_folder, "meta", f"meta_{category_name}.{extension}"), compression),
+             output_path(os.path.join(output_folder, "filtered", f"filtered_{category_name}.{extension}"), compression),
+             os.path.join(output_folder, "price_stats", f"{category_name}.json")]),
+        f"meta/{category_name}/save_train": (
+            [train_file], {}, [os.path.join(output_folder, "train", f"{category_name}.csv")]),
+    }
+
+
+def find_stale_steps(categories, input_folder, output_folder, stream=False, compression=None, cache=None,
+                     force=False):
+    """
+    List the (category, step key, reason) of every step process_metadata would rebuild.
+    """
+    cache = cache or BuildCache.for_folder(output_folder)
+    stale = []
+    for category_name in categories:
+        for key, (inputs, params, outputs) in metadata_steps(category_name, input_folder, output_folder,
+                                                             stream, compression).items():
+            reason, _ = cache.check(key, inputs, params, outputs, force)
+            if reason:
+                stale.append((category_name, key, reason))
+    return stale
+
+
+def process_metadata(category_name, input_folder, output_folder, vocabulary=None, stream=False, compression=None,
+                     report=None, cache=None, force=False):
     """
     Process metadata and training data for a single category.
+    Price stats of the category are written to output/price_stats/<category>.json;
+    merge_price_stats combines them into price_summary.json.
+
+    :param vocabulary: Vocabulary the users and items of the category are added to (staged; the caller
+                       writes it with vocabulary.save()). Defaults to the one in output_folder, saved right away.
+    :param stream: Write meta/filtered records incrementally as JSONL (meta_*.jsonl, filtered_*.jsonl)
+                   instead of building JSON arrays in memory. Peak memory does not grow with the category size.
+    :param compression: Compress the meta/filtered outputs with "gz" or "zst" (inputs are detected automatically).
+    :param report: RunReport recording the stages (load_train, filter_meta, save_train) of the category.
+    :param cache: BuildCache; filter_meta and save_train are skipped when their inputs and parameters are unchanged
+                  since their last successful run. load_train always runs, as it updates the vocabulary.
+    :param force: Rebuild every step even if the cache says it is up to date.
+    :return: The PriceStats of the category.
     """
+    report = report or RunReport("meta")
+    steps = metadata_steps(category_name, input_folder, output_folder, stream, compression)
+    filter_key, save_key = f"meta/{category_name}/filter_meta", f"meta/{category_name}/save_train"
+    stale = {key: cache.check(key, *steps[key], force) if cache else ("no cache", None) for key in steps}
     train_file = os.path.join(input_folder, "train", f"{category_name}.csv")
     meta_file = os.path.join(input_folder, "meta", f"meta_{category_name}.jsonl")
 
+    extension = "jsonl" if stream else "json"
     output_train = os.path.join(output_folder, "train", f"{category_name}.csv")
-    output_meta = os.path.join(output_folder, "meta", f"meta_{category_name}.json")
-    output_filtered = os.path.join(output_folder, "filtered", f"filtered_{category_name}.json")
-    output_user_file = os.path.join(output_folder, "user", f"user_{category_name}.json")
-    output_item_file = os.path.join(output_folder, "item", f"item_{category_name}.json")
+    output_meta = output_path(os.path.join(output_folder, "meta", f"meta_{category_name}.{extension}"), compression)
+    output_filtered = output_path(os.path.join(output_folder, "filtered", f"filtered_{category_name}.{extension}"),
+                                  compression)
+    save_vocabulary = vocabulary is None
+    vocabulary = vocabulary or Vocabulary.for_folder(output_folder)
 
     os.makedirs(output_folder, exist_ok=True)
-    for subfolder in ["train", "meta", "filtered", "user", "item"]:
+    for subfolder in ["train", "meta", "filtered"]:
         os.makedirs(os.path.join(output_folder, subfolder), exist_ok=True)
 
-    train_df = pd.read_csv(train_file)
-    train_asins = set(train_df["parent_asin"].unique())
+    with report.stage("load_train", category=category_name) as stage:
+        train_file = resolve_input(train_file)
+        stage.read(train_file)
+        train_df = pd.read_csv(train_file)
+        train_asins = set(train_df["parent_asin"].unique())
 
-    unique_users.update(set(train_df["user_id"].unique()))
-    unique_items.update(train_asins)
+        vocabulary.add_category(category_name, train_df["user_id"].unique(), train_df["parent_asin"].unique())
+        if save_vocabulary:
+            vocabulary.save()
+        stage.rows_in, stage.rows_out = len(train_df), len(train_asins)
 
-    with open(output_user_file, "w") as f:
-        json.dump(list(unique_users), f)
-    with open(output_item_file, "w") as f:
-        json.dump(list(unique_items), f)
-
-    meta_data, filtered_data, prices = [], [], []
-
-    with open(meta_file, "r") as meta_f:
-        for line in tqdm(meta_f, desc=f"Processing meta {category_name}"):
-            data = json.loads(line)
-            parent_asin = data.get("parent_asin")
-
-            if parent_asin in train_asins:
-                meta_data.append(data)
-
-                price = data.get("price")
-                if isinstance(price, str):
-                    if price.startswith("from "):
-                        try:
-                            data["price"] = float(price.split("from ")[1])
-                        except ValueError:
-                            data["price"] = None
-                    else:
-                        try:
-                            data["price"] = float(price)
-                        except ValueError:
-                            data["price"] = None
-                            type_of_price.add(price)
-
-                if data["price"] is not None:
-                    prices.append(data["price"])
-
-                if data.get("title") and data.get("images", []):
-                    filtered_data.append(copy.deepcopy(data))
-
-    average_price = sum(prices) / len(prices) if prices else 0
-    if average_price == 0:
-        price_summary["categories_with_no_price"].append(category_name)
-
-    price_summary["category_avg_prices"][category_name] = average_price
-
-    for item in filtered_data:
-        if item.get("price") is None:
-            item["price"] = 0 if average_price == 0 else average_price
-
-    with open(output_meta, "w") as out_meta:
-        json.dump(meta_data, out_meta, indent=4)
-    with open(output_filtered, "w") as out_filtered:
-        json.dump(filtered_data, out_filtered, indent=4)
-
-    train_df_filtered = train_df[train_df["parent_asin"].isin(train_asins)]
-    train_df_filtered.to_csv(output_train, index=False)
+    if stale[filter_key][0] is None:
+        print(f"✔️  Meta of category {category_name} is up to date, skipped")
+        price_stats = load_category_stats(output_folder, category_name)
+    else:
+        price_stats = filter_metadata(category_name, meta_file, output_folder, output_meta, output_filtered,
+                                      train_asins, stream, compression, report)
+        if cache:
+            cache.record(filter_key, stale[filter_key][1], steps[filter_key][2])
+            cache.save()
+
+    if stale[save_key][0] is None:
+        print(f"✔️  Train data of category {category_name} is up to date, skipped")
+    else:
+        with report.stage("save_train", category=category_name) as stage:
+            train_df_filtered = train_df[train_df["parent_asin"].isin(train_asins)]
+            train_df_filtered.to_csv(output_train, index=False)
+            stage.rows_in, stage.rows_out = len(train_df), len(train_df_filtered)
+            stage.wrote(output_train)
+        if cache:
+            cache.record(save_key, stale[save_key][1], steps[save_key][2])
+            cache.save()
 
     print(f"\nMetadata for category {category_name} processed successfully.\n")
+    return price_stats
 
 
 if __name__ == "__main__":
     categories = ["Unknown"]
     input_folder, output_folder = "input", "output"
-    unique_users, unique_items = set(), set()
-
-    price_summary_file = os.path.join(output_folder, "price_summary.json")
-    type_of_price_file = os.path.join(output_folder, "type_of_price.json")
-
-    if os.path.exists(type_of_price_file):
-        with open(type_of_price_file, "r") as f:
-            type_of_price = set(json.load(f))
-    else:
-        type_of_price = set()
-
-    if os.path.exists(price_summary_file):
-        with open(price_summary_file, "r") as f:
-            price_summary = json.load(f)
-    else:
-        price_summary = {"categories_with_no_price": [], "category_avg_prices": {}}
-
+    stream = False  # True: write meta/filtered as JSONL with constant memory
+    compression = None  # "gz" or "zst" to compress the meta/filtered outputs
+    profile_stage = None  # "load_train", "filter_meta" or "save_train" to run that stage under cProfile
+    force = False  # True: rebuild every category even if its inputs did not change since the last run
+    dry_run = False  # True: only list the steps that would be rebuilt
+    vocabulary = Vocabulary.for_folder(output_folder)
+
+    cache = BuildCache.for_folder(output_folder)
+    stale_steps = find_stale_steps(categories, input_folder, output_folder, stream, compression, cache, force)
+    for category, key, reason in stale_steps:
+        print(f"🔄 {key}: {reason}")
+    print(f"{len(stale_steps)} stale step(s) in {len(categories)} categories.")
+    if dry_run:
+        raise SystemExit(0)  # A dry run leaves the build cache untouched
+    cache.save()
+
+    report_file = default_report_file(output_folder, "meta")
+    report = RunReport("meta", profile_stage, os.path.dirname(report_file))
     for category in categories:
-        process_metadata(category, input_folder, output_folder, unique_users, unique_items, price_summary, type_of_price)
-
-    all_prices = [price for price in price_summary["category_avg_prices"].values() if price > 0]
-    price_summary["avg_prices_all_category"] = sum(all_prices) / len(all_prices) if all_prices else 0
+        process_metadata(category, input_folder, output_folder, vocabulary, stream, compression, report, cache, force)
+    vocabulary.save()
 
-    with open(price_summary_file, "w") as f:
-        json.dump(price_summary, f, indent=4)
+    # Combine per-category price stats (including those of earlier runs) into price_summary.json
+    merge_price_stats(output_folder)
 
-    with open(type_of_price_file, "w") as f:
-        json.dump(list(type_of_price), f, indent=4)
-        
-    print(f"Saved {len(unique_users)} unique user IDs.")
-    print(f"Saved {len(unique_items)} unique item IDs.")
+    print(f"Saved {vocabulary.size('user')} unique user IDs.")
+    print(f"Saved {vocabulary.size('item')} unique item IDs.")
 
+    report.save(report_file)
     print(f"\nMetadata processing completed.\n")
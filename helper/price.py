@@ -0,0 +1,199 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Approximate quantiles use a fixed log10-spaced histogram from 0.01 to 1,000,000
+# (1000 bins, ~1.9% relative bin width), so stats use constant memory and merge by addition.
+HIST_LOG_MIN, HIST_LOG_MAX, HIST_BINS = -2.0, 6.0, 1000
+SUMMARY_QUANTILES = [0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+def parse_prices(values):
+    """
+    Parse a column of raw meta "price" values in one batch.
+    Numbers and numeric strings are kept, "from X" strings become X, anything else becomes NaN.
+
+    :return: (float64 array with NaN for missing prices, set of unparsable price strings)
+    """
+    raw = pd.Series(values, dtype=object)
+    prices = pd.to_numeric(raw, errors="coerce")
+
+    # Only entries that are not numbers or numeric strings can be "from X" or unparsable. The .str accessor
+    # raises when none of them is a string (e.g. a batch of floats and None), so check the inferred type first.
+    failed = raw[prices.isna().to_numpy() & raw.notna().to_numpy()]
+    if pd.api.types.infer_dtype(failed, skipna=True) in ("string", "mixed", "mixed-integer"):
+        strings = failed[failed.str.len().notna()]
+    else:
+        strings = failed.iloc[:0]
+    is_from = strings.str.startswith("from ").astype(bool) if len(strings) else pd.Series(False, index=strings.index)
+    if is_from.any():
+        prices[strings.index[is_from]] = pd.to_numeric(strings[is_from].str[5:], errors="coerce")
+
+    unparsable = set(strings[~is_from & prices[strings.index].isna()])
+    return prices.to_numpy(dtype=np.float64), unparsable
+
+
+class PriceStats:
+    """
+    Running price aggregates (count, sum, min, max, approximate quantiles) in constant memory.
+    Stats of different shards or categories combine with merge().
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.histogram = np.zeros(HIST_BINS, dtype=np.int64)
+        self.unparsable = set()
+
+    def update(self, prices, unparsable=()):
+        prices = np.asarray(prices, dtype=np.float64)
+        prices = prices[np.isfinite(prices)]
+        self.unparsable.update(unparsable)
+        if len(prices) == 0:
+            return self
+        self.count += len(prices)
+        self.total += float(prices.sum())
+        self.min = min(self.min, float(prices.min()))
+        self.max = max(self.max, float(prices.max()))
+        log_prices = np.log10(np.maximum(prices, 10 ** HIST_LOG_MIN))
+        bins = ((log_prices - HIST_LOG_MIN) / (HIST_LOG_MAX - HIST_LOG_MIN) * HIST_BINS).astype(np.int64)
+        self.histogram += np.bincount(np.clip(bins, 0, HIST_BINS - 1), minlength=HIST_BINS)
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.histogram += other.histogram
+        self.unparsable.update(other.unparsable)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def quantile(self, q):
+        if not self.count:
+            return 0
+        cumulative = np.cumsum(self.histogram)
+        bin_index = int(np.searchsorted(cumulative, q * self.count))
+        bin_width = (HIST_LOG_MAX - HIST_LOG_MIN) / HIST_BINS
+        estimate = 10 ** (HIST_LOG_MIN + (bin_index + 0.5) * bin_width)
+        return min(max(estimate, self.min), self.max)
+
+    def summary(self):
+        result = {"count": self.count, "mean": self.mean,
+                  "min": self.min if self.count else 0, "max": self.max if self.count else 0}
+        result.update({f"p{int(q * 100)}": self.quantile(q) for q in SUMMARY_QUANTILES})
+        return result
+
+    def to_dict(self):
+        nonzero = np.flatnonzero(self.histogram)
+        return {"count": self.count, "total": self.total, "min": self.min if self.count else None,
+                "max": self.max if self.count else None,
+                "histogram": {int(i): int(self.histogram[i]) for i in nonzero},
+                "unparsable": sorted(self.unparsable)}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count, stats.total = data["count"], data["total"]
+        if data["count"]:
+            stats.min, stats.max = data["min"], data["max"]
+        for i, n in data["histogram"].items():
+            stats.histogram[int(i)] = n
+        stats.unparsable = set(data["unparsable"])
+        return stats
+
+
+def normalize_prices(records, stats=None):
+    """
+    Parse the "price" field of a batch of meta records in place (float or None)
+    and add the parsed prices to stats.
+    """
+    prices, unparsable = parse_prices([record.get("price") for record in records])
+    for record, price in zip(records, prices.tolist()):
+        record["price"] = None if price != price else price
+    if stats is not None:
+        stats.update(prices, unparsable)
+    return prices
+
+
+def save_category_stats(stats, output_folder, category_name):
+    """
+    Write the price stats of one category (or shard) to output/price_stats/<name>.json.
+    Each worker writes its own file, so parallel runs never rewrite a shared file.
+    """
+    stats_folder = os.path.join(output_folder, "price_stats")
+    os.makedirs(stats_folder, exist_ok=True)
+    stats_file = os.path.join(stats_folder, f"{category_name}.json")
+    with open(stats_file + ".tmp", "w") as f:
+        json.dump(stats.to_dict(), f)
+    os.replace(stats_file + ".tmp", stats_file)
+
+
+def load_category_stats(output_folder, category_name):
+    """
+    Read the price stats written by save_category_stats (empty stats if the file does not exist).
+    """
+    stats_file = os.path.join(output_folder, "price_stats", f"{category_name}.json")
+    if not os.path.exists(stats_file):
+        return PriceStats()
+    with open(stats_file, "r") as f:
+        return PriceStats.from_dict(json.load(f))
+
+
+def merge_price_stats(output_folder):
+    """
+    Combine every output/price_stats/<category>.json into price_summary.json and type_of_price.json.
+    Shard files named <category>.<shard>.json are merged into their category.
+    """
+    stats_folder = os.path.join(output_folder, "price_stats")
+    categories = {}
+    for file_name in sorted(os.listdir(stats_folder)) if os.path.isdir(stats_folder) else []:
+        if not file_name.endswith(".json"):
+            continue
+        category_name = file_name[:-len(".json")].split(".")[0]
+        with open(os.path.join(stats_folder, file_name), "r") as f:
+            stats = PriceStats.from_dict(json.load(f))
+        categories.setdefault(category_name, PriceStats()).merge(stats)
+
+    all_stats = PriceStats()
+    for stats in categories.values():
+        all_stats.merge(stats)
+
+    category_avg_prices = {name: stats.mean for name, stats in categories.items()}
+    all_prices = [price for price in category_avg_prices.values() if price > 0]
+    price_summary = {
+        "categories_with_no_price": [name for name, price in category_avg_prices.items() if price == 0],
+        "category_avg_prices": category_avg_prices,
+        "avg_prices_all_category": sum(all_prices) / len(all_prices) if all_prices else 0,
+        "category_price_stats": {name: stats.summary() for name, stats in categories.items()},
+        "all_categories_price_stats": all_stats.summary(),
+    }
+
+    with open(os.path.join(output_folder, "price_summary.json"), "w") as f:
+        json.dump(price_summary, f, indent=4)
+    with open(os.path.join(output_folder, "type_of_price.json"), "w") as f:
+        json.dump(sorted(all_stats.unparsable), f, indent=4)
+    return price_summary
+
+
+if __name__ == "__main__":
+    # Quick check of parse_prices on mixed, numeric-only / null and empty batches
+    batches = {
+        "mixed": ([12.5, "7", "from 12.99", "N/A", None], [12.5, 7.0, 12.99, np.nan, np.nan], {"N/A"}),
+        "numeric_and_null": ([None, 12.5, 3], [np.nan, 12.5, 3.0], set()),
+        "null_only": ([None, None], [np.nan, np.nan], set()),
+        "empty": ([], [], set()),
+        "strings_only": (["from 3", "4.50", "call"], [3.0, 4.5, np.nan], {"call"}),
+        "non_string_objects": ([["9.99"], 5, None], [np.nan, 5.0, np.nan], set()),
+    }
+    for name, (values, expected, expected_unparsable) in batches.items():
+        prices, unparsable = parse_prices(values)
+        assert np.array_equal(prices, expected, equal_nan=True) and unparsable == expected_unparsable, name
+        print(f"✅ {name}: {prices.tolist()} {sorted(unparsable)}")
@@ -1,62 +1,160 @@
 import os
 import json
+import shutil
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
-def process_reviews(category_name, input_folder, output_folder):
+from split_large_file import find_shard_offsets
+from compressed_io import open_input, open_output, output_path, resolve_input, detect_compression
+from instrumentation import RunReport, default_report_file
+
+# Reviews are written by json.dumps, so the field always looks like this. A quote inside
+# a string value is escaped (\"), so the pattern cannot match inside review text.
+ASIN_KEY = b'"parent_asin": "'
+
+
+def load_train_asins(train_file):
+    """
+    Load the set of parent_asin values (as bytes) from a train CSV using a real CSV parser,
+    so quoted fields containing commas are handled correctly.
+    """
+    train_file = resolve_input(train_file)
+    if not os.path.exists(train_file):
+        return set()
+    asins = pd.read_csv(train_file, usecols=["parent_asin"], dtype=str)["parent_asin"].dropna()
+    return {asin.encode("utf-8") for asin in asins.unique()}
+
+
+def extract_parent_asin(line):
     """
-    Process reviews for a single category efficiently using chunk processing.
-    This avoids memory overload by writing output incrementally.
+    Extract parent_asin from a raw JSONL line (bytes) without parsing the whole record.
+    Falls back to json.loads when the line is not in the expected layout.
+    """
+    start = line.find(ASIN_KEY)
+    if start < 0:
+        asin = json.loads(line).get("parent_asin")
+        return asin.encode("utf-8") if asin else None
+    start += len(ASIN_KEY)
+    return line[start:line.find(b'"', start)]
+
+
+def filter_review_range(review_file, start, end, train_asins, output_file, desc=None, compression=None):
+    """
+    Copy the review lines in byte range [start, end) whose parent_asin is in train_asins
+    to output_file, unchanged (one compact JSON record per line).
+    With end=None the whole file is streamed, which also works for gzip/zstd inputs.
+
+    :return: (lines read, lines kept)
+    """
+    read, kept = 0, 0
+    if end is None:
+        review_f = open_input(review_file)
+        remaining = float("inf")
+    else:
+        review_f = open(review_file, "rb")
+        review_f.seek(start)
+        remaining = end - start
+    with review_f, open_output(output_file, "wb", compression) as out_review:
+        lines = tqdm(review_f, desc=desc) if desc else review_f
+        for line in lines:
+            if remaining <= 0:
+                break
+            remaining -= len(line)
+            if not line.strip():
+                continue
+            read += 1
+            if extract_parent_asin(line) in train_asins:
+                if not line.endswith(b"\n"):
+                    line += b"\n"
+                out_review.write(line)
+                kept += 1
+    return read, kept
+
+
+_shared_train_asins = None
+
+def _init_worker(train_asins):
+    global _shared_train_asins
+    _shared_train_asins = train_asins
+
+def _filter_shard_task(args):
+    review_file, start, end, output_file, compression = args
+    return filter_review_range(review_file, start, end, _shared_train_asins, output_file, compression=compression)
+
+
+def process_reviews(category_name, input_folder, output_folder, workers=1, compression=None, report=None):
+    """
+    Filter the reviews of a single category against its train set and write them as JSONL.
+
+    Lines are matched on parent_asin without a full JSON parse and copied as-is. With workers > 1
+    the review file is split into line-aligned byte ranges processed in parallel, so large files
+    no longer need to be split by hand into _part1/_part2/... files.
+
+    Compressed review files (.jsonl.gz / .jsonl.zst) are streamed directly; they cannot be split
+    into byte ranges, so they are always read by a single process.
 
     :param category_name: The category name to process.
     :param input_folder: The folder containing input data.
     :param output_folder: The folder to store processed output.
-    :param chunk_size: Number of lines to process before writing to file.
+    :param workers: Number of processes (and byte-range shards) used for an uncompressed review file.
+    :param compression: Compress the output with "gz" or "zst".
+    :param report: RunReport recording the stages (load_train_asins, filter_reviews) of the category.
+    :return: (review lines read, review lines kept)
     """
+    report = report or RunReport("review")
     train_file = os.path.join(input_folder, "train", f"{category_name}.csv")
-    
-    # review_file = os.path.join(input_folder, "review", f"{category_name}.jsonl")
-    # output_review = os.path.join(output_folder, "review", f"{category_name}.json")
-    
-    # For large files - add _part1, _part2, etc... to the end of the file
-    review_file = os.path.join(input_folder, "review", f"{category_name}_part3.jsonl")
-    
-    output_review = os.path.join(output_folder, "review", f"{category_name}_part3.json")
+    review_file = resolve_input(os.path.join(input_folder, "review", f"{category_name}.jsonl"))
+    output_review = output_path(os.path.join(output_folder, "review", f"{category_name}.jsonl"), compression)
 
     os.makedirs(os.path.join(output_folder, "review"), exist_ok=True)
 
     # Step 1: Load train ASINs into a set for fast lookup
-    train_asins = set()
-    if os.path.exists(train_file):
-        with open(train_file, "r") as train_f:
-            next(train_f)  # Skip header
-            for line in train_f:
-                parts = line.strip().split(",")
-                if len(parts) > 1:
-                    train_asins.add(parts[1])  # parent_asin column
-
-    # Step 2: Process reviews with chunking to avoid memory overload
-    with open(review_file, "r") as review_f, open(output_review, "w") as out_review:
-        out_review.write("[")  # Start JSON array
-        first_item = True  # To handle commas correctly
-
-        for line in tqdm(review_f, desc=f"Processing reviews {category_name}"):
-            data = json.loads(line)
-            if data.get("parent_asin") in train_asins:
-                if not first_item:
-                    out_review.write(",\n")  # Add comma between JSON objects
-                json.dump(data, out_review, indent=4)
-                first_item = False
-
-        out_review.write("\n]")  # Close JSON array
-    
-    print(f"Reviews for category {category_name} processed successfully.\n")
+    with report.stage("load_train_asins", category=category_name) as stage:
+        stage.read(resolve_input(train_file))
+        train_asins = load_train_asins(train_file)
+        stage.rows_out = len(train_asins)
+
+    # Step 2: Filter reviews, one byte range per worker
+    with report.stage("filter_reviews", category=category_name) as stage:
+        stage.read(review_file)
+        if workers <= 1 or detect_compression(review_file):
+            read, kept = filter_review_range(review_file, 0, None, train_asins, output_review,
+                                             desc=f"Processing reviews {category_name}", compression=compression)
+        else:
+            offsets = find_shard_offsets(review_file, workers)
+            part_files = [f"{output_review}.part{i}" for i in range(workers)]
+            tasks = [(review_file, offsets[i], offsets[i + 1], part_files[i], compression) for i in range(workers)]
+
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(train_asins,)) as executor:
+                counts = list(tqdm(executor.map(_filter_shard_task, tasks), total=workers,
+                                   desc=f"Processing reviews {category_name}"))
+            read, kept = sum(c[0] for c in counts), sum(c[1] for c in counts)
+
+            # Step 3: Concatenate shard outputs in file order (concatenated gzip members / zstd frames stay valid)
+            with open(output_review, "wb") as out_review:
+                for part_file in part_files:
+                    with open(part_file, "rb") as part_f:
+                        shutil.copyfileobj(part_f, out_review, 16 * 1024 * 1024)
+                    os.remove(part_file)
+        stage.rows_in, stage.rows_out = read, kept
+        stage.wrote(output_review)
+
+    print(f"Reviews for category {category_name} processed successfully ({kept}/{read} kept).\n")
+    return read, kept
 
 if __name__ == "__main__":
     categories = ["Home_and_Kitchen"]  # Modify as needed
     input_folder, output_folder = "input", "output"
-    
+    workers = os.cpu_count() or 1
+    compression = None  # "gz" or "zst" to compress the output
+    profile_stage = None  # "load_train_asins" or "filter_reviews" to run that stage under cProfile
 
+    report_file = default_report_file(output_folder, "review")
+    report = RunReport("review", profile_stage, os.path.dirname(report_file))
     for category in categories:
-        process_reviews(category, input_folder, output_folder)
-    
+        process_reviews(category, input_folder, output_folder, workers, compression, report)
+
+    report.save(report_file)
     print(f"Review processing completed.\n")
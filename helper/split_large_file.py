@@ -1,59 +1,210 @@
 import os
+import json
+from bisect import bisect_right
+from itertools import islice
+import numpy as np
 
-def split_file(input_file, output_folder, num_parts=3, buffer_size=10000):
+from compressed_io import detect_compression, wrap_reader
+
+CHUNK_SIZE = 16 * 1024 * 1024
+CHECKPOINT_LINES = 65536  # Ghi offset byte của mỗi dòng thứ CHECKPOINT_LINES trong index để read_line seek tới
+
+
+def find_shard_offsets(input_file, num_parts):
+    """
+    Chia file thành num_parts đoạn byte, mỗi ranh giới nằm ở đầu một dòng.
+    Chỉ seek, không đọc toàn bộ file.
+    - Trả về list num_parts + 1 offset; phần i là [offsets[i], offsets[i + 1]).
+    """
+    size = os.path.getsize(input_file)
+    offsets = [0]
+    with open(input_file, "rb") as f:
+        for i in range(1, num_parts):
+            f.seek(max(size * i // num_parts, offsets[-1]))
+            if f.tell() > 0:
+                f.seek(f.tell() - 1)
+                f.readline()  # Nhảy tới đầu dòng kế tiếp
+            offsets.append(f.tell())
+    offsets.append(size)
+    return offsets
+
+
+def _scan_range(infile, start, end, outfile=None, checkpoints=None):
+    """
+    Đọc đoạn [start, end) theo chunk lớn, đếm số dòng và (nếu có outfile) chép ra file khác.
+    Nếu có list checkpoints: thêm offset byte (trong file) của dòng CHECKPOINT_LINES, 2 * CHECKPOINT_LINES, ...
+    của đoạn.
+    """
+    infile.seek(start)
+    remaining, lines, last, position = end - start, 0, b"\n", start
+    while remaining > 0:
+        chunk = infile.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        newlines = chunk.count(b"\n")
+        if checkpoints is not None and (lines + newlines) // CHECKPOINT_LINES > lines // CHECKPOINT_LINES:
+            # Dòng thứ L bắt đầu ngay sau ký tự xuống dòng thứ L của đoạn
+            positions = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord("\n"))
+            targets = np.arange((lines // CHECKPOINT_LINES + 1) * CHECKPOINT_LINES, lines + newlines + 1,
+                                CHECKPOINT_LINES)
+            checkpoints.extend(int(position + positions[target - lines - 1] + 1) for target in targets)
+        lines += newlines
+        position += len(chunk)
+        last = chunk[-1:]
+        if outfile is not None:
+            outfile.write(chunk)
+    if last != b"\n":
+        lines += 1  # Dòng cuối không có ký tự xuống dòng
+    return lines
+
+
+def _split_compressed(input_file, compression, output_folder, stem, num_parts):
+    """
+    Tách file nén (.gz/.zst) trong một lần giải nén. Không biết trước kích thước sau giải nén, nên
+    chuyển sang phần mới khi lượng dữ liệu nén đã đọc vượt qua k/num_parts kích thước file nén.
+    """
+    compressed_size = os.path.getsize(input_file)
+    raw = open(input_file, "rb")
+    shards, first_line, written = [], 0, 0
+    outfile, shard = None, None
+
+    with wrap_reader(raw, compression, read_size=256 * 1024) as stream:  # Đọc từng đoạn nhỏ để raw.tell() đủ mịn
+        for line in stream:
+            if shard is None or (len(shards) < num_parts and raw.tell() >= compressed_size * len(shards) / num_parts):
+                if outfile is not None:
+                    outfile.close()
+                shard = {"offset": written, "length": 0, "first_line": first_line, "lines": 0,
+                         "file": f"{stem}_part{len(shards) + 1}.jsonl"}
+                shards.append(shard)
+                outfile = open(os.path.join(output_folder, shard["file"]), "wb")
+            outfile.write(line)
+            shard["length"] += len(line)
+            shard["lines"] += 1
+            first_line += 1
+            written += len(line)
+    if outfile is not None:
+        outfile.close()
+    return shards, written
+
+
+def index_path_for(input_file):
+    for extension in (".gz", ".zst"):
+        input_file = input_file[:-len(extension)] if input_file.endswith(extension) else input_file
+    return os.path.splitext(input_file)[0] + ".index.json"
+
+
+def split_file(input_file, output_folder=None, num_parts=3, index_only=False):
     """
-    Tách file JSONL lớn thành num_parts phần bằng nhau.
-    - input_file: file gốc (JSONL).
-    - output_folder: thư mục chứa file tách.
+    Tách file JSONL lớn thành num_parts phần theo offset byte (ranh giới ở đầu dòng), đọc file đúng một lần.
+    - input_file: file gốc (JSONL), tên phần được suy ra từ tên file (vd. Books.jsonl -> Books_part1.jsonl).
+    - output_folder: thư mục chứa file tách (mặc định = thư mục của file gốc).
     - num_parts: số phần cần tách (mặc định = 3).
-    - buffer_size: số dòng ghi mỗi lần (giúp tăng tốc độ).
+    - index_only: chỉ ghi file index (offset, số dòng) cho từng phần, không sao chép dữ liệu;
+      consumer dùng iter_shard / read_line để seek thẳng vào file gốc. Với file không nén, mỗi phần có thêm
+      "checkpoints": offset byte của mỗi dòng thứ CHECKPOINT_LINES, để read_line không phải đọc từ đầu phần.
+    - File nén (.gz/.zst) được giải nén trực tiếp khi tách; index_only cần file không nén vì không seek được.
+    - Trả về index (đồng thời ghi ra <tên file>.index.json cạnh file gốc).
     """
-    print(f"🔄 Đang đếm số dòng trong {input_file}...")
+    output_folder = output_folder or os.path.dirname(input_file)
+    compression = detect_compression(input_file)
+    stem = os.path.basename(input_file)
+    for extension in (".gz", ".zst", ".jsonl"):
+        stem = stem[:-len(extension)] if stem.endswith(extension) else stem
+
+    print(f"✂️  Bắt đầu {'đánh index' if index_only else 'tách file'} {input_file} ({num_parts} phần)...")
+
+    if compression:
+        if index_only:
+            raise ValueError(f"Byte-offset index requires an uncompressed file: {input_file}")
+        shards, size = _split_compressed(input_file, compression, output_folder, stem, num_parts)
+        return _save_index(input_file, shards, size)
+
+    offsets = find_shard_offsets(input_file, num_parts)
+    shards, first_line = [], 0
+    with open(input_file, "rb") as infile:
+        for i in range(num_parts):
+            start, end = offsets[i], offsets[i + 1]
+            shard = {"offset": start, "length": end - start, "first_line": first_line, "checkpoints": []}
+            if index_only:
+                shard["lines"] = _scan_range(infile, start, end, checkpoints=shard["checkpoints"]) \
+                    if end > start else 0
+            else:
+                shard["file"] = f"{stem}_part{i + 1}.jsonl"
+                with open(os.path.join(output_folder, shard["file"]), "wb") as outfile:
+                    shard["lines"] = _scan_range(infile, start, end, outfile, shard["checkpoints"]) \
+                        if end > start else 0
+            first_line += shard["lines"]
+            shards.append(shard)
+
+    return _save_index(input_file, shards, offsets[-1])
+
 
-    # Đếm tổng số dòng trong file gốc
-    with open(input_file, "r", encoding="utf-8") as f:
-        total_lines = sum(1 for _ in f)
+def _save_index(input_file, shards, size):
+    lines = sum(shard["lines"] for shard in shards)
+    index = {"file": os.path.basename(input_file), "size": size, "lines": lines,
+             "checkpoint_lines": CHECKPOINT_LINES, "shards": shards}
+    with open(index_path_for(input_file), "w") as f:
+        json.dump(index, f, indent=2)
 
-    split_size = total_lines // num_parts  # Số dòng mỗi phần
-    print(f"✅ Tổng số dòng: {total_lines}, mỗi phần: ~{split_size} dòng.")
+    print(f"✅ Hoàn tất. Tổng số dòng: {lines}")
+    for shard in shards[:20]:
+        print(f"   📂 {shard.get('file', 'offset ' + str(shard['offset']))}: {shard['lines']} dòng")
+    return index
 
-    # Mở tất cả file output trước để tránh mở/đóng nhiều lần
-    output_files = [
-        open(os.path.join(output_folder, f"Home_and_Kitchen_part{i+1}.jsonl"), "w", encoding="utf-8")
-        for i in range(num_parts)
-    ]
 
-    print(f"✂️  Bắt đầu tách file...")
-    
-    with open(input_file, "r", encoding="utf-8") as infile:
-        buffer = [[] for _ in range(num_parts)]  # Mảng chứa buffer cho từng file
-        for i, line in enumerate(infile):
-            part_index = min(i // split_size, num_parts - 1)  # Xác định file tương ứng
-            buffer[part_index].append(line)
+def load_index(input_file):
+    with open(index_path_for(input_file), "r") as f:
+        return json.load(f)
 
-            # Ghi batch nếu đủ buffer_size
-            if len(buffer[part_index]) >= buffer_size:
-                output_files[part_index].writelines(buffer[part_index])
-                buffer[part_index].clear()
 
-        # Ghi nốt dữ liệu còn lại
-        for j in range(num_parts):
-            if buffer[j]:
-                output_files[j].writelines(buffer[j])
+def _check_seekable(input_file):
+    # Index của file nén ghi offset theo byte đã giải nén, không seek được trên file gốc
+    if detect_compression(input_file):
+        raise ValueError(f"Cannot seek into compressed file {input_file}: its index offsets refer to the "
+                         f"decompressed data, read the _partN.jsonl files written by split_file instead")
 
-    # Đóng tất cả file output
-    for f in output_files:
-        f.close()
 
-    print(f"✅ Tách file hoàn tất. Đã tạo:")
-    for i in range(num_parts):
-        print(f"   📂 Home_and_Kitchen_part{i+1}.jsonl")
+def iter_shard(input_file, shard):
+    """
+    Duyệt các dòng (bytes) của một phần trực tiếp trên file gốc (không nén).
+    """
+    _check_seekable(input_file)
+    with open(input_file, "rb") as f:
+        f.seek(shard["offset"])
+        remaining = shard["length"]
+        for line in f:
+            if remaining <= 0:
+                break
+            remaining -= len(line)
+            yield line
+
+
+def read_line(input_file, index, n):
+    """
+    Đọc dòng thứ n (bắt đầu từ 0) của file gốc (không nén): seek tới checkpoint gần nhất trước dòng trong phần chứa nó,
+    rồi đọc tuần tự tối đa CHECKPOINT_LINES dòng. Index cũ không có checkpoint thì đọc tuần tự từ đầu phần.
+    """
+    _check_seekable(input_file)
+    if not 0 <= n < index["lines"]:
+        raise IndexError(f"Line {n} out of range (file has {index['lines']} lines)")
+    starts = [shard["first_line"] for shard in index["shards"]]
+    shard = index["shards"][bisect_right(starts, n) - 1]
+    line_in_shard = n - shard["first_line"]
+    checkpoints = shard.get("checkpoints", [])
+    step = index.get("checkpoint_lines", CHECKPOINT_LINES)
+    checkpoint = min(line_in_shard // step, len(checkpoints))
+    with open(input_file, "rb") as f:
+        f.seek(checkpoints[checkpoint - 1] if checkpoint else shard["offset"])
+        return next(islice(f, line_in_shard - checkpoint * step, None))
+
 
 if __name__ == "__main__":
     category = "Home_and_Kitchen"
     input_folder = "input"
     output_folder = os.path.join(input_folder, "review")
+    index_only = False  # True: chỉ ghi <category>.index.json, không tạo file _partN
 
     input_file = os.path.join(output_folder, f"{category}.jsonl")
 
-    split_file(input_file, output_folder)
+    split_file(input_file, output_folder, index_only=index_only)
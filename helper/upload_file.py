@@ -1,24 +1,182 @@
-from huggingface_hub import HfApi
 import os
+import sys
+import time
+import random
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-dataset_repo = "GinDev/Amazon-Reviews-2023-Recommendation"  # Thay bằng repo của bạn
-review_folder = "output/review"  # Thư mục chứa các file cần upload
+try:
+    from huggingface_hub import HfApi
+except ImportError:  # Optional: only needed for HfBackend
+    HfApi = None
 
-# Khởi tạo API
-api = HfApi()
+from build_cache import BuildCache
+from instrumentation import RunReport, default_report_file
 
-# Kiểm tra và upload từng file trong thư mục review
-for file_name in os.listdir(review_folder):
-    file_path = os.path.join(review_folder, file_name)
+MANIFEST_FILE = ".upload_manifest.json"
 
-    if os.path.isfile(file_path):
-        print(f"🔄 Uploading: {file_name} ...")
 
-        api.upload_file(
-            path_or_fileobj=file_path,
-            path_in_repo=f"review/{file_name}",  # Chỉ lấy tên file, không lấy thư mục local
-            repo_id=dataset_repo,
-            repo_type="dataset"
-        )
+class HfBackend:
+    """
+    Uploads to a Hugging Face Hub repository through HfApi.upload_file.
+    """
 
-        print(f"✅ Uploaded: {file_name}")
+    def __init__(self, repo_id, repo_type="dataset", api=None):
+        if api is None and HfApi is None:
+            raise ImportError("Uploading to the Hub requires the 'huggingface_hub' package "
+                              "(pip install huggingface_hub)")
+        self.api = api or HfApi()
+        self.repo_id, self.repo_type = repo_id, repo_type
+
+    @property
+    def target(self):
+        return f"hf://{self.repo_type}/{self.repo_id}"
+
+    def upload_file(self, path, path_in_repo):
+        self.api.upload_file(path_or_fileobj=path, path_in_repo=path_in_repo, repo_id=self.repo_id,
+                             repo_type=self.repo_type)
+
+
+class LocalBackend:
+    """
+    Stand-in for the Hub that copies files into a local directory (for testing and dry runs).
+    A file is copied to a temporary name and renamed, so an interrupted upload never leaves a partial file.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    @property
+    def target(self):
+        return f"file://{os.path.abspath(self.root)}"
+
+    def upload_file(self, path, path_in_repo):
+        destination = os.path.join(self.root, path_in_repo)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(path, destination + ".partial")
+        os.replace(destination + ".partial", destination)
+
+
+def upload_with_retry(backend, path, path_in_repo, retries=5, backoff=2.0):
+    """
+    Upload one file, retrying failures with exponential backoff and jitter
+    (backoff * 2^attempt seconds, scaled by a random factor in [0.5, 1.5)).
+    Returns the number of attempts; re-raises the last error after retries failed retries.
+    """
+    for attempt in range(retries + 1):
+        try:
+            backend.upload_file(path, path_in_repo)
+            return attempt + 1
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt * (0.5 + random.random())
+            print(f"⚠️  Upload of {path_in_repo} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def plan_uploads(folder, prefix, backend, manifest, force=False):
+    """
+    List the files directly inside folder (hidden files such as the manifest are skipped) and
+    return [(path, path_in_repo, reason, fingerprint)] for those that must be uploaded.
+    A file is skipped when its content hash matches the last successful upload to the same target.
+    """
+    plan = []
+    for file_name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, file_name)
+        if file_name.startswith(".") or not os.path.isfile(path):
+            continue
+        path_in_repo = f"{prefix}/{file_name}" if prefix else file_name
+        reason, fingerprint = manifest.check(f"{backend.target}/{path_in_repo}", [path], {}, [], force)
+        if reason is not None:
+            plan.append((path, path_in_repo, reason, fingerprint))
+    return plan
+
+
+def unchanged_since_plan(manifest, path):
+    """
+    True if path still has the size and mtime it had when plan_uploads fingerprinted it,
+    i.e. the uploaded bytes are the ones the fingerprint describes.
+    """
+    cached = manifest.files.get(os.path.abspath(path))
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    return cached is not None and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns
+
+
+def upload_folder(folder, prefix, backend, workers=4, retries=5, backoff=2.0, force=False, report=None):
+    """
+    Upload the files of folder to backend under prefix/ with a bounded pool of workers.
+
+    Each completed upload is recorded in folder/.upload_manifest.json right away, so an interrupted run
+    resumes with the files that were not uploaded yet, and later runs skip unchanged files. A file whose
+    size or mtime changed after it was planned is not recorded (and counts as failed).
+    Returns (uploaded, skipped, failed) file counts.
+    """
+    report = report or RunReport("upload")
+    manifest = BuildCache(os.path.join(folder, MANIFEST_FILE))
+
+    with report.stage("plan", folder=folder) as stage:
+        files = [name for name in os.listdir(folder) if not name.startswith(".")
+                 and os.path.isfile(os.path.join(folder, name))]
+        plan = plan_uploads(folder, prefix, backend, manifest, force)
+        stage.rows_in, stage.rows_out = len(files), len(plan)
+    manifest.save()  # Keep the file hashes even if the upload is interrupted
+    print(f"📋 {len(plan)} of {len(files)} files to upload to {backend.target}")
+
+    uploaded, failed = 0, 0
+    with report.stage("upload", folder=folder) as stage:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(upload_with_retry, backend, path, path_in_repo, retries, backoff):
+                       (path, path_in_repo, reason, fingerprint)
+                       for path, path_in_repo, reason, fingerprint in plan}
+            try:
+                for future in as_completed(futures):
+                    path, path_in_repo, reason, fingerprint = futures[future]
+                    try:
+                        attempts = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"❌ Failed: {path_in_repo} ({e})")
+                        continue
+                    if not unchanged_since_plan(manifest, path):
+                        # Not recorded, so the next run uploads the current content again
+                        failed += 1
+                        print(f"❌ Changed during upload: {path_in_repo} (run again to upload the new content)")
+                        continue
+                    # Results are handled in this thread only, so the manifest needs no lock
+                    manifest.record(f"{backend.target}/{path_in_repo}", fingerprint, [])
+                    manifest.save()
+                    uploaded += 1
+                    stage.read(path)
+                    retried = f", {attempts} attempts" if attempts > 1 else ""
+                    print(f"✅ Uploaded: {path_in_repo} ({reason}{retried})")
+            except KeyboardInterrupt:
+                # Uploads already recorded in the manifest are not repeated on the next run
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+        stage.rows_in, stage.rows_out = len(plan), uploaded
+
+    return uploaded, len(files) - len(plan), failed
+
+
+if __name__ == "__main__":
+    dataset_repo = "GinDev/Amazon-Reviews-2023-Recommendation"  # Replace with your repo
+    review_folder = "output/review"  # Folder with the files to upload
+    path_prefix = "review"  # Folder inside the repo
+    local_target = None  # e.g. "output/hub_mirror" to copy into a local folder instead of the Hub
+    workers = 4
+    retries = 5
+    force = False  # True to upload every file even if unchanged
+
+    backend = LocalBackend(local_target) if local_target else HfBackend(dataset_repo)
+    report_file = default_report_file("output", "upload")
+    report = RunReport("upload")
+    uploaded, skipped, failed = upload_folder(review_folder, path_prefix, backend, workers, retries, force=force,
+                                              report=report)
+    report.save(report_file)
+    print(f"Upload completed: {uploaded} uploaded, {skipped} unchanged, {failed} failed.\n")
+    if failed:
+        sys.exit(1)
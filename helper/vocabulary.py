@@ -0,0 +1,121 @@
+import os
+import sys
+from functools import reduce
+import numpy as np
+
+# IdDictionary (append-only string -> int32 ID store) is shared with preprocessing/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "preprocessing"))
+from id_dictionary import IdDictionary
+
+VOCABULARY_FOLDER = "vocabulary"
+KINDS = ("user", "item")
+
+
+class Vocabulary:
+    """
+    Global user/item vocabulary shared by all categories, stored under output/vocabulary/:
+
+        user_dict/, item_dict/      IdDictionary of every user_id / parent_asin seen so far
+        user/<category>.npy,        sorted unique int32 IDs of the users / items of one category
+        item/<category>.npy
+
+    IDs are append-only, so they stay valid across runs and categories. Each category only stores its
+    own members (not the cumulative set), and cross-category questions are answered with sorted-array
+    set operations on the membership arrays.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.dicts = {kind: IdDictionary.load(os.path.join(folder, f"{kind}_dict")) for kind in KINDS}
+        self.pending = {}
+
+    @classmethod
+    def for_folder(cls, output_folder):
+        return cls(os.path.join(output_folder, VOCABULARY_FOLDER))
+
+    def size(self, kind):
+        return len(self.dicts[kind])
+
+    def add_category(self, category_name, users, items):
+        """
+        Intern the users and items of a category and stage its membership arrays; written by save().
+        """
+        for kind, values in (("user", users), ("item", items)):
+            values = np.asarray(list(values) if isinstance(values, (set, frozenset)) else values, dtype=object)
+            self.pending[(kind, category_name)] = np.unique(self.dicts[kind].add(values)).astype(np.int32)
+
+    def save(self):
+        """
+        Write the dictionaries, then the staged membership arrays, so a membership file never refers
+        to an ID that is missing from the saved dictionary.
+        """
+        for dictionary in self.dicts.values():
+            dictionary.save()
+        for (kind, category_name), members in self.pending.items():
+            os.makedirs(os.path.join(self.folder, kind), exist_ok=True)
+            path = self.membership_file(kind, category_name)
+            np.save(path + ".tmp.npy", members)
+            os.replace(path + ".tmp.npy", path)
+        self.pending = {}
+
+    def membership_file(self, kind, category_name):
+        return os.path.join(self.folder, kind, f"{category_name}.npy")
+
+    def categories(self, kind="user"):
+        folder = os.path.join(self.folder, kind)
+        saved = {name[:-len(".npy")] for name in os.listdir(folder) if name.endswith(".npy")} \
+            if os.path.isdir(folder) else set()
+        return sorted(saved | {category_name for pending_kind, category_name in self.pending if pending_kind == kind})
+
+    def members(self, kind, category_name):
+        """
+        Sorted int32 IDs of the users or items of a category (memory-mapped once saved).
+        """
+        if (kind, category_name) in self.pending:
+            return self.pending[(kind, category_name)]
+        return np.load(self.membership_file(kind, category_name), mmap_mode="r")
+
+    def union(self, kind, categories):
+        return np.unique(np.concatenate([self.members(kind, name) for name in categories] or
+                                        [np.empty(0, dtype=np.int32)]))
+
+    def intersection(self, kind, categories):
+        # Smallest arrays first keeps the intermediate results small
+        arrays = sorted((self.members(kind, name) for name in categories), key=len)
+        if not arrays:
+            return np.empty(0, dtype=np.int32)
+        return reduce(lambda left, right: np.intersect1d(left, right, assume_unique=True), arrays[1:],
+                      np.asarray(arrays[0]))
+
+    def active_in(self, kind, categories=None, min_categories=2):
+        """
+        (ids, counts) of the users/items that appear in at least min_categories of categories (default: all).
+        """
+        categories = self.categories(kind) if categories is None else categories
+        if not categories:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        ids, counts = np.unique(np.concatenate([self.members(kind, name) for name in categories]),
+                                return_counts=True)
+        keep = counts >= min_categories
+        return ids[keep], counts[keep]
+
+    def lookup(self, kind, values):
+        return self.dicts[kind].lookup(np.asarray(values, dtype=object))
+
+    def decode(self, kind, ids):
+        return [value.decode() for value in self.dicts[kind].reverse(np.asarray(ids, dtype=np.int64))]
+
+
+if __name__ == "__main__":
+    output_folder = "output"
+    categories = None  # None for every category in the vocabulary
+    min_categories = 2
+
+    vocabulary = Vocabulary.for_folder(output_folder)
+    for kind in KINDS:
+        names = vocabulary.categories(kind) if categories is None else categories
+        print(f"{vocabulary.size(kind)} unique {kind}s in {len(names)} categories")
+        for name in names:
+            print(f"  {name}: {len(vocabulary.members(kind, name))}")
+        ids, _ = vocabulary.active_in(kind, names, min_categories)
+        print(f"  in at least {min_categories} categories: {len(ids)}")
@@ -0,0 +1,131 @@
+import os
+import json
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+
+# Tên file nhị phân tương ứng với từng file text
+BINARY_FILES = {
+    "train": "{cate}.train.rating.npy",
+    "test": "{cate}.test.rating.npy",
+    "negative": "{cate}.test.negative.npy",
+}
+TEXT_FILES = {
+    "train": "{cate}.train.rating",
+    "test": "{cate}.test.rating",
+    "negative": "{cate}.test.negative",
+}
+MANIFEST_FILE = "{cate}.manifest.json"
+
+# ==== Ghép item test và negative thành ma trận (số user test, 1 + num_negatives) ====
+# Cột 0 là item dương, các cột sau là negative (-1 nếu user không đủ negative).
+def build_candidate_matrix(test_data, test_negative):
+    test_data = np.asarray(test_data, dtype=np.int32).reshape(-1, 2)
+    test_negative = np.asarray(test_negative, dtype=np.int32).reshape(len(test_data), -1)
+    return np.column_stack((test_data[:, 1], test_negative))
+
+# ==== Lưu output dạng mảng int32 .npy (đọc lại được bằng np.load(mmap_mode='r')) ====
+def save_binary_output(cate_name, train_data, test_data, test_negative, output_dir, num_users=None, num_items=None):
+    os.makedirs(output_dir, exist_ok=True)
+    arrays = {
+        "train": np.asarray(train_data, dtype=np.int32).reshape(-1, 2),
+        "test": np.asarray(test_data, dtype=np.int32).reshape(-1, 2),
+        "negative": build_candidate_matrix(test_data, test_negative),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(output_dir, BINARY_FILES[name].format(cate=cate_name)), array)
+
+    if num_users is None:
+        num_users = int(max(arrays["train"][:, 0].max(initial=-1), arrays["test"][:, 0].max(initial=-1))) + 1
+    if num_items is None:
+        num_items = int(max(arrays["train"][:, 1].max(initial=-1), arrays["negative"].max(initial=-1))) + 1
+
+    manifest = {
+        "version": FORMAT_VERSION,
+        "category": cate_name,
+        "dtype": "int32",
+        "num_users": int(num_users),
+        "num_items": int(num_items),
+        "num_negatives": arrays["negative"].shape[1] - 1,
+        "files": {name: BINARY_FILES[name].format(cate=cate_name) for name in arrays},
+        "shapes": {name: list(array.shape) for name, array in arrays.items()},
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE.format(cate=cate_name)), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+# ==== Đọc output nhị phân, mặc định memory-map (zero copy) ====
+def load_binary_output(output_dir, cate_name, mmap_mode="r"):
+    with open(os.path.join(output_dir, MANIFEST_FILE.format(cate=cate_name)), "r") as f:
+        manifest = json.load(f)
+    arrays = {name: np.load(os.path.join(output_dir, file_name), mmap_mode=mmap_mode)
+              for name, file_name in manifest["files"].items()}
+    return manifest, arrays
+
+# ==== Đọc 3 file text (.train.rating, .test.rating, .test.negative) thành mảng int32 ====
+def read_text_output(output_dir, cate_name, num_negatives=99):
+    def read_pairs(path):
+        return pd.read_csv(path, sep="\t", header=None, names=["user", "item"],
+                           dtype=np.int32).to_numpy()
+
+    train_data = read_pairs(os.path.join(output_dir, TEXT_FILES["train"].format(cate=cate_name)))
+    test_data = read_pairs(os.path.join(output_dir, TEXT_FILES["test"].format(cate=cate_name)))
+
+    # Mỗi dòng: user, item dương và tối đa num_negatives negative (ít hơn nếu user không đủ negative).
+    # Đọc thêm một cột dư: dòng nào có giá trị ở cột đó là file được ghi với nhiều negative hơn num_negatives;
+    # index_col=False để pandas không lấy các cột thừa làm index (sẽ lệch cột âm thầm).
+    negative_path = os.path.join(output_dir, TEXT_FILES["negative"].format(cate=cate_name))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", pd.errors.ParserWarning)
+        try:
+            negative_df = pd.read_csv(negative_path, sep="\t", header=None, names=range(3 + num_negatives),
+                                      index_col=False)
+        except pd.errors.ParserError as e:  # Một dòng sau dòng đầu có nhiều hơn num_negatives + 3 cột
+            raise ValueError(f"{negative_path} has lines with more than {num_negatives} negatives; pass the "
+                             f"num_negatives the file was written with ({e})") from e
+    too_long = negative_df[2 + num_negatives].notna().to_numpy()
+    if too_long.any():
+        raise ValueError(f"{negative_path} line {int(np.argmax(too_long)) + 1} has more than {num_negatives} "
+                         f"negatives; pass the num_negatives the file was written with")
+    test_negative = negative_df.iloc[:, 2:2 + num_negatives].fillna(-1).to_numpy(dtype=np.int32)
+    return train_data, test_data, test_negative
+
+# ==== Ghi mảng ra 3 file text theo đúng định dạng của save_output_per_category ====
+def write_text_output(cate_name, train_data, test_data, candidates, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    np.savetxt(os.path.join(output_dir, TEXT_FILES["train"].format(cate=cate_name)),
+               np.asarray(train_data), fmt="%d", delimiter="\t")
+    np.savetxt(os.path.join(output_dir, TEXT_FILES["test"].format(cate=cate_name)),
+               np.asarray(test_data), fmt="%d", delimiter="\t")
+
+    with open(os.path.join(output_dir, TEXT_FILES["negative"].format(cate=cate_name)), "w") as f:
+        for (u, _), row in zip(test_data, candidates):
+            f.write("\t".join(map(str, [u, *row[row >= 0]])) + "\n")
+
+# ==== Chuyển đổi giữa định dạng text và nhị phân ====
+def text_to_binary(output_dir, cate_name, num_negatives=99):
+    train_data, test_data, test_negative = read_text_output(output_dir, cate_name, num_negatives)
+    return save_binary_output(cate_name, train_data, test_data, test_negative, output_dir)
+
+def binary_to_text(output_dir, cate_name):
+    _, arrays = load_binary_output(output_dir, cate_name)
+    write_text_output(cate_name, arrays["train"], arrays["test"], arrays["negative"], output_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("direction", choices=["to_binary", "to_text"], help="Chiều chuyển đổi")
+    parser.add_argument("--output_dir", default="../data/output", help="Thư mục output của pre_process.py")
+    parser.add_argument("--categories", nargs='+', required=True, help="Danh sách tên category cần chuyển")
+    parser.add_argument("--num_negatives", type=int, default=99, help="Số negative tối đa mỗi dòng trong file text")
+    args = parser.parse_args()
+
+    for cate_name in args.categories:
+        category_output_dir = os.path.join(args.output_dir, cate_name)
+        if args.direction == "to_binary":
+            text_to_binary(category_output_dir, cate_name, args.num_negatives)
+        else:
+            binary_to_text(category_output_dir, cate_name)
+        print(f"✅ Converted {cate_name} ({args.direction})")
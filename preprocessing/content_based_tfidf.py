@@ -0,0 +1,226 @@
+import os
+import re
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from tqdm import tqdm
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "helper"))
+from compressed_io import open_input, resolve_input
+from id_dictionary import IdDictionary
+from similarity import TOPK_FILES, TOPK_MANIFEST, sample_recall, topk_similarity
+
+N_FEATURES = 2 ** 20
+# Số item có trọng số lớn nhất giữ lại cho mỗi token khi tìm ứng viên top-K (xem similarity.prune_postings);
+# 0 = top-K chính xác. Khi > 0, recall so với top-K chính xác được đo trên RECALL_SAMPLE item và in ra.
+MAX_POSTINGS = 0
+RECALL_SAMPLE = 200
+RECORD_CHUNK_SIZE = 10_000
+READ_SIZE = 1024 * 1024
+TEXT_FIELDS = ["title", "features", "description"]
+TOKEN_PATTERN = re.compile(r"\w\w+")
+
+FEATURE_FILES = {
+    "indptr": "{cate}.content_tfidf.indptr.npy",
+    "indices": "{cate}.content_tfidf.indices.npy",
+    "data": "{cate}.content_tfidf.data.npy",
+    "idf": "{cate}.content_idf.npy",
+}
+FEATURE_MANIFEST = "{cate}.content_tfidf.json"
+
+# ==== Đọc lần lượt từng record của file filtered_*.json / *.jsonl (có thể nén .gz/.zst) ====
+# File .json (mảng JSON do process_metadata ghi khi stream=False) được giải mã dần bằng raw_decode trên
+# từng đoạn READ_SIZE ký tự, nên không cần nạp cả mảng vào bộ nhớ.
+def iter_records(path):
+    decoder = json.JSONDecoder()
+    with open_input(path, "r") as f:
+        buffer, pos = f.read(READ_SIZE), 0
+        while True:
+            # Bỏ khoảng trắng, dấu phẩy, xuống dòng và ngoặc vuông giữa các record
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,[]":
+                pos += 1
+            if pos == len(buffer):
+                buffer, pos = f.read(READ_SIZE), 0
+                if not buffer:
+                    return
+                continue
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                more = f.read(READ_SIZE)
+                if not more:
+                    raise
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield record
+            pos = end
+
+# ==== Ghép các trường văn bản của một record thành một chuỗi ====
+def record_text(record, fields=TEXT_FIELDS):
+    parts = []
+    for field in fields:
+        value = record.get(field)
+        if isinstance(value, list):
+            parts.extend(str(v) for v in value if v)
+        elif value:
+            parts.append(str(value))
+    return " ".join(parts)
+
+# ==== Đếm token của một chunk văn bản vào N_FEATURES bucket (hashing trick, không cần từ điển) ====
+# pd.util.hash_array cho cùng giá trị ở mọi process / lần chạy (khác hash() của Python).
+# Trả về CSR (len(texts), n_features) chứa số lần xuất hiện của mỗi bucket.
+def hash_counts(texts, n_features=N_FEATURES):
+    tokens = [TOKEN_PATTERN.findall(text.lower()) for text in texts]
+    lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    flat = np.array([token for t in tokens for token in t], dtype=object)
+    buckets = (pd.util.hash_array(flat) % np.uint64(n_features)).astype(np.int32) if len(flat) else \
+        np.empty(0, dtype=np.int32)
+    rows = np.repeat(np.arange(len(texts), dtype=np.int32), lengths)
+    counts = sp.csr_matrix((np.ones(len(buckets), dtype=np.float32), (rows, buckets)),
+                           shape=(len(texts), n_features))
+    counts.sum_duplicates()
+    return counts
+
+# ==== Từ điển item ID của bước tiền xử lý (IdDictionary nếu có, không thì *_item2id.json) ====
+def load_item_dictionary(category_dir, cate_name):
+    path = os.path.join(category_dir, f"{cate_name}_item_dict")
+    if os.path.exists(os.path.join(path, "keys.npy")):
+        return IdDictionary.load(path)
+    with open(os.path.join(category_dir, f"{cate_name}_item2id.json"), "r") as f:
+        return IdDictionary.from_mapping(path, json.load(f))
+
+# ==== Đọc filtered meta theo chunk và tạo ma trận số lần xuất hiện, dòng = item ID ====
+# Record có parent_asin không có trong từ điển (không thuộc dữ liệu đã tiền xử lý) bị bỏ qua;
+# nếu một item có nhiều record thì giữ record đầu tiên. Item không có record là dòng rỗng.
+def build_counts(filtered_file, item_dict, num_items, n_features=N_FEATURES, chunk_size=RECORD_CHUNK_SIZE,
+                 desc=None):
+    chunks, chunk_items, stats = [], [], {"records": 0, "unknown": 0}
+    asins, texts = [], []
+
+    def flush():
+        ids = item_dict.lookup(np.array(asins, dtype=object))
+        known = ids >= 0
+        stats["unknown"] += int((~known).sum())
+        if known.any():
+            chunks.append(hash_counts([text for text, ok in zip(texts, known) if ok], n_features))
+            chunk_items.append(ids[known])
+        asins.clear()
+        texts.clear()
+
+    for record in tqdm(iter_records(filtered_file), desc=desc):
+        stats["records"] += 1
+        asins.append(record.get("parent_asin") or "")
+        texts.append(record_text(record))
+        if len(asins) >= chunk_size:
+            flush()
+    flush()
+
+    items = np.concatenate(chunk_items) if chunk_items else np.empty(0, dtype=np.int32)
+    counts = sp.vstack(chunks, format="csr") if chunks else sp.csr_matrix((0, n_features), dtype=np.float32)
+    items, first = np.unique(items, return_index=True)
+    # Đặt dòng của từng record vào đúng item ID
+    placement = sp.csr_matrix((np.ones(len(items), dtype=np.float32), (items, first)),
+                              shape=(num_items, counts.shape[0]))
+    stats["items"] = len(items)
+    return (placement @ counts).tocsr(), stats
+
+# ==== TF-IDF: tf = 1 + log(số lần), idf = log((1 + n) / (1 + df)) + 1, mỗi dòng chuẩn hoá L2 ====
+# Bucket xuất hiện ở ít hơn min_df item (không tạo ra cặp tương đồng) hoặc nhiều hơn max_df * n item (từ quá phổ
+# biến, làm số cặp cùng xuất hiện tăng theo n^2) bị bỏ.
+def tfidf_weights(counts, min_df=2, max_df=0.1):
+    n = max(int((np.diff(counts.indptr) > 0).sum()), 1)
+    df = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+    idf[(df < min_df) | (df > max_df * n)] = 0
+
+    weights = counts.copy()
+    weights.data = (1 + np.log(weights.data)) * idf[weights.indices]
+    weights.eliminate_zeros()
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    weights.data /= np.repeat(np.where(norms > 0, norms, 1), np.diff(weights.indptr)).astype(np.float32)
+    return weights, idf
+
+# ==== Pipeline cho một category: TF-IDF từ filtered meta + top-K item gần nhất theo nội dung ====
+# meta_output_dir: thư mục output của helper/meta.py (chứa filtered/), output_dir: output của pre_process.py.
+# max_postings: 0 (mặc định) để tính top-K chính xác trên mọi cặp item có chung token; > 0 để tìm gần đúng
+# (nhanh hơn nhiều khi có nhiều item), recall trên một mẫu item được in ra và ghi vào manifest.
+def build_content_features(meta_output_dir, output_dir, cate_name, k=50, n_features=N_FEATURES, min_df=2,
+                           max_df=0.1, max_postings=MAX_POSTINGS, block_size=None, workers=1):
+    category_dir = os.path.join(output_dir, cate_name)
+    filtered_file = resolve_input(os.path.join(meta_output_dir, "filtered", f"filtered_{cate_name}.jsonl"))
+    if not os.path.exists(filtered_file):
+        filtered_file = resolve_input(os.path.join(meta_output_dir, "filtered", f"filtered_{cate_name}.json"))
+    item_dict = load_item_dictionary(category_dir, cate_name)
+    num_items = len(item_dict)
+
+    counts, stats = build_counts(filtered_file, item_dict, num_items, n_features, desc=f"Hashing {cate_name}")
+    weights, idf = tfidf_weights(counts, min_df, max_df)
+    buckets = len(np.unique(counts.indices))
+    del counts
+
+    files = {name: file_name.format(cate=cate_name) for name, file_name in FEATURE_FILES.items()}
+    for name, array in [("indptr", weights.indptr.astype(np.int64)), ("indices", weights.indices.astype(np.int32)),
+                        ("data", weights.data.astype(np.float32)), ("idf", idf)]:
+        np.save(os.path.join(category_dir, files[name]), array)
+    manifest = {"category": cate_name, "num_items": num_items, "n_features": n_features, "fields": TEXT_FIELDS,
+                "min_df": min_df, "max_df": max_df, "nnz": int(weights.nnz), "source": filtered_file, **stats,
+                "files": files}
+    with open(os.path.join(category_dir, FEATURE_MANIFEST.format(cate=cate_name)), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"🔤 {cate_name}: {stats['items']} of {num_items} items with content, {weights.nnz} non-zeros "
+          f"({stats['unknown']} records not in the item IDs)")
+    if weights.nnz == 0:
+        print(f"⚠️  {cate_name}: TF-IDF matrix is empty, all {buckets} token buckets were dropped by "
+              f"min_df={min_df} / max_df={max_df}; content neighbours will be empty (lower --min_df or raise --max_df)")
+
+    topk_files = {name: file_name.format(cate=cate_name, kind="content") for name, file_name in TOPK_FILES.items()}
+    topk_similarity(weights, k, "dot", os.path.join(category_dir, topk_files["indices"]),
+                    os.path.join(category_dir, topk_files["scores"]), block_size, workers,
+                    desc=f"Top-{k} content {cate_name}", max_postings=max_postings)
+    topk_manifest = {"category": cate_name, "kind": "content", "metric": "cosine", "k": k, "rows": num_items,
+                     "num_items": num_items, "max_postings": max_postings, "files": topk_files}
+    if max_postings:
+        indices = np.load(os.path.join(category_dir, topk_files["indices"]), mmap_mode="r")
+        recall, sample_size = sample_recall(weights, indices, k, "dot", RECALL_SAMPLE)
+        topk_manifest["recall"] = {"value": recall, "sample_size": sample_size}
+        print(f"🎯 {cate_name}: recall@{k} of the max_postings={max_postings} search vs exact top-{k}: "
+              f"{recall:.3f} on {sample_size} items")
+    with open(os.path.join(category_dir, TOPK_MANIFEST.format(cate=cate_name, kind="content")), "w") as f:
+        json.dump(topk_manifest, f, indent=2)
+    print(f"✅ Saved content features of {cate_name} to {category_dir}")
+
+# ==== Đọc ma trận TF-IDF đã lưu (memory-map) ====
+def load_content_features(category_dir, cate_name, mmap_mode="r"):
+    with open(os.path.join(category_dir, FEATURE_MANIFEST.format(cate=cate_name)), "r") as f:
+        manifest = json.load(f)
+    arrays = {name: np.load(os.path.join(category_dir, file_name), mmap_mode=mmap_mode)
+              for name, file_name in manifest["files"].items()}
+    matrix = sp.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]),
+                           shape=(manifest["num_items"], manifest["n_features"]))
+    return manifest, matrix, arrays["idf"]
+
+# ==== Gọi script từ dòng lệnh ====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--meta_output_dir", default="../helper/output",
+                        help="Thư mục output của helper/meta.py (chứa filtered/)")
+    parser.add_argument("--output_dir", default="../data/output", help="Thư mục output của pre_process.py")
+    parser.add_argument("--categories", nargs='+', required=True, help="Danh sách tên category")
+    parser.add_argument("--k", type=int, default=50, help="Số item gần nhất giữ lại cho mỗi item")
+    parser.add_argument("--n_features", type=int, default=N_FEATURES, help="Số bucket của hashing trick")
+    parser.add_argument("--min_df", type=int, default=2, help="Bỏ token xuất hiện ở ít hơn min_df item")
+    parser.add_argument("--max_df", type=float, default=0.1, help="Bỏ token xuất hiện ở hơn max_df * số item")
+    parser.add_argument("--max_postings", type=int, default=MAX_POSTINGS,
+                        help="Số item giữ lại mỗi token khi tìm ứng viên top-K (0 = chính xác, > 0 = gần đúng, in recall)")
+    parser.add_argument("--block_size", type=int, default=None, help="Số item mỗi block khi tính top-K")
+    parser.add_argument("--workers", type=int, default=1, help="Số process tính các block song song")
+    args = parser.parse_args()
+
+    for cate_name in args.categories:
+        build_content_features(args.meta_output_dir, args.output_dir, cate_name, args.k, args.n_features,
+                               args.min_df, args.max_df, args.max_postings, args.block_size, args.workers)
+
+# === RUN ===: python content_based_tfidf.py --meta_output_dir ../helper/output --output_dir ../data/output --categories Gift_Cards --k 50 --workers 4
@@ -0,0 +1,126 @@
+import os
+import time
+import queue
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+
+from negative_sampling import build_interaction_index, sample_shard
+from binary_format import MANIFEST_FILE, TEXT_FILES, load_binary_output
+from similarity import load_train_pairs
+
+# ==== Sinh batch train cho NCF: (user, item, label) với negative mới ở mỗi epoch ====
+# Đọc train/test qua memory-map (output --binary) hoặc file text, không ghi thêm negative ra đĩa.
+# Mỗi batch gồm các positive theo thứ tự đã xáo trộn của epoch, mỗi positive kèm num_negatives item
+# user chưa tương tác (trong train và test), rút bằng negative_sampling.sample_shard rồi xáo trộn trong batch.
+# Kết quả chỉ phụ thuộc (seed, epoch), batch được chuẩn bị trước bởi một thread nền (prefetch batch).
+class TrainBatchGenerator:
+    def __init__(self, category_dir, cate_name, batch_size=1024, num_negatives=4, seed=42, prefetch=4,
+                 shuffle=True):
+        if os.path.exists(os.path.join(category_dir, MANIFEST_FILE.format(cate=cate_name))):
+            manifest, arrays = load_binary_output(category_dir, cate_name)
+            self.train, test = arrays["train"], arrays["test"]
+            self.num_users, self.num_items = manifest["num_users"], manifest["num_items"]
+        else:
+            self.train, self.num_users, self.num_items = load_train_pairs(category_dir, cate_name)
+            test = pd.read_csv(os.path.join(category_dir, TEXT_FILES["test"].format(cate=cate_name)), sep="\t",
+                               header=None, usecols=[0, 1], dtype=np.int32).to_numpy()
+        self.keys, self.indptr = build_interaction_index(self.train, test, self.num_items)
+
+        self.num_negatives = num_negatives
+        # Số positive mỗi batch; mỗi batch có tối đa batch_size dòng
+        self.positives_per_batch = max(1, batch_size // (1 + num_negatives))
+        self.seed = seed
+        self.prefetch = prefetch
+        self.shuffle = shuffle
+
+    def __len__(self):
+        return -(-len(self.train) // self.positives_per_batch)
+
+    # ==== Tạo một batch: positive [start, end) theo thứ tự order của epoch ====
+    def make_batch(self, order, start, end, seed):
+        positives = np.asarray(self.train[np.sort(order[start:end])])
+        users, items = positives[:, 0], positives[:, 1]
+        negatives = sample_shard(users, self.keys, self.indptr, self.num_items, self.num_negatives, seed)
+
+        negative_users = np.repeat(users, self.num_negatives)
+        negative_items = negatives.ravel()
+        valid = negative_items >= 0  # User đã tương tác gần hết catalogue có thể thiếu negative
+        batch_users = np.concatenate([users, negative_users[valid]]).astype(np.int32)
+        batch_items = np.concatenate([items, negative_items[valid]]).astype(np.int32)
+        labels = np.concatenate([np.ones(len(users), np.float32), np.zeros(int(valid.sum()), np.float32)])
+
+        permutation = np.random.default_rng(seed).permutation(len(labels))
+        return batch_users[permutation], batch_items[permutation], labels[permutation]
+
+    def _batches(self, epoch):
+        sequence = np.random.SeedSequence([self.seed, epoch])
+        order = np.random.default_rng(sequence).permutation(len(self.train)) if self.shuffle \
+            else np.arange(len(self.train))
+        seeds = sequence.spawn(len(self))
+        for b, start in enumerate(range(0, len(self.train), self.positives_per_batch)):
+            yield self.make_batch(order, start, start + self.positives_per_batch, seeds[b])
+
+    # ==== Duyệt các batch của một epoch, batch được sinh trước trong thread nền ====
+    def epoch(self, epoch=0):
+        if self.prefetch <= 0:
+            yield from self._batches(epoch)
+            return
+
+        batches = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for batch in self._batches(epoch):
+                    while not stop.is_set():
+                        try:
+                            batches.put(batch, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set():
+                        return
+                batches.put(done)
+            except Exception as e:  # Chuyển lỗi sang thread của trainer
+                batches.put(e)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is done:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            # Trainer dừng giữa epoch (break) hoặc có lỗi: báo thread nền dừng
+            stop.set()
+            producer.join()
+
+# ==== Đo tốc độ sinh batch từ dòng lệnh ====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default="../data/output", help="Thư mục output của pre_process.py")
+    parser.add_argument("--category", required=True, help="Tên category")
+    parser.add_argument("--batch_size", type=int, default=1024, help="Số dòng (user, item, label) mỗi batch")
+    parser.add_argument("--num_negatives", type=int, default=4, help="Số negative cho mỗi positive")
+    parser.add_argument("--epochs", type=int, default=1, help="Số epoch cần duyệt")
+    parser.add_argument("--prefetch", type=int, default=4, help="Số batch chuẩn bị trước (0 = không dùng thread)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    loader = TrainBatchGenerator(os.path.join(args.output_dir, args.category), args.category, args.batch_size,
+                                 args.num_negatives, args.seed, args.prefetch)
+    for epoch in range(args.epochs):
+        start, rows = time.perf_counter(), 0
+        for users, items, labels in loader.epoch(epoch):
+            rows += len(labels)
+        seconds = time.perf_counter() - start
+        print(f"⏱️  Epoch {epoch}: {len(loader)} batches, {rows} rows in {seconds:.1f}s ({rows / seconds:,.0f} rows/s)")
+
+# === RUN ===: python dataset_loader.py --output_dir ../data/output --category Gift_Cards --batch_size 1024 --num_negatives 4
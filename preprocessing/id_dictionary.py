@@ -0,0 +1,116 @@
+import os
+import json
+import argparse
+import numpy as np
+
+# ==== Chuyển mảng chuỗi (str/object/bytes) sang mảng bytes cố định độ dài ====
+def to_bytes(values):
+    values = np.asarray(values)
+    if values.dtype.kind == "S":
+        return values
+    try:
+        return values.astype("S")
+    except UnicodeEncodeError:
+        return np.char.encode(values.astype(str), "utf-8")
+
+# ==== Từ điển ID bền vững, chỉ thêm (append-only) ====
+# Lưu trong một thư mục gồm:
+#   keys.npy  : chuỗi gốc dạng bytes, sắp tăng dần (tra xuôi bằng np.searchsorted)
+#   ids.npy   : ID số nguyên tương ứng với từng phần tử của keys.npy
+#   order.npy : vị trí trong keys.npy của từng ID (tra ngược: keys[order[id]])
+# Chuỗi mới nhận ID tiếp theo, chuỗi đã có giữ nguyên ID qua các lần chạy.
+class IdDictionary:
+    def __init__(self, path, keys=None, ids=None, order=None):
+        self.path = path
+        self.keys = keys if keys is not None else np.empty(0, dtype="S1")
+        self.ids = ids if ids is not None else np.empty(0, dtype=np.int32)
+        self.order = order if order is not None else np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.keys)
+
+    # ==== Mở từ điển đã lưu (memory-map), hoặc tạo rỗng nếu chưa có ====
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        if not os.path.exists(os.path.join(path, "keys.npy")):
+            return cls(path)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+                  for name in ("keys", "ids", "order")}
+        return cls(path, **arrays)
+
+    # ==== Tạo từ điển từ mapping {chuỗi: id} có sẵn (vd. *_user2id.json), giữ nguyên ID ====
+    @classmethod
+    def from_mapping(cls, path, mapping):
+        keys = to_bytes(np.array(list(mapping.keys()), dtype=object))
+        ids = np.fromiter(mapping.values(), dtype=np.int32, count=len(mapping))
+        if len(ids) and not np.array_equal(np.sort(ids), np.arange(len(ids))):
+            raise ValueError("Mapping IDs must be the consecutive integers 0..n-1")
+        sort_idx = np.argsort(keys, kind="stable")
+        dictionary = cls(path, keys[sort_idx], ids[sort_idx])
+        dictionary.order = dictionary._build_order()
+        return dictionary
+
+    def _build_order(self):
+        order = np.empty(len(self.ids), dtype=np.int32)
+        order[self.ids] = np.arange(len(self.ids), dtype=np.int32)
+        return order
+
+    # ==== Tra xuôi: chuỗi -> ID (-1 nếu chưa có) ====
+    def lookup(self, values):
+        values = to_bytes(values)
+        result = np.full(len(values), -1, dtype=np.int32)
+        if len(self.keys) == 0:
+            return result
+        pos = np.minimum(np.searchsorted(self.keys, values), len(self.keys) - 1)
+        found = self.keys[pos] == values
+        result[found] = self.ids[pos[found]]
+        return result
+
+    # ==== Tra ngược: ID -> chuỗi gốc (bytes) ====
+    def reverse(self, ids):
+        return self.keys[self.order[np.asarray(ids)]]
+
+    # ==== Thêm chuỗi mới (theo thứ tự sắp xếp) và trả về ID của toàn bộ values ====
+    # Chỉ tra các giá trị khác nhau một lần; chuỗi mới được chèn vào đúng vị trí (np.insert) thay vì sắp xếp lại.
+    def add(self, values):
+        values = to_bytes(values)
+        uniques, inverse = np.unique(values, return_inverse=True)
+        ids = np.full(len(uniques), -1, dtype=np.int32)
+        pos = np.searchsorted(self.keys, uniques)
+        if len(self.keys):
+            found = self.keys[np.minimum(pos, len(self.keys) - 1)] == uniques
+            ids[found] = self.ids[pos[found]]
+        new = ids < 0
+        if new.any():
+            start = len(self.keys)
+            ids[new] = np.arange(start, start + int(new.sum()), dtype=np.int32)
+            width = max(self.keys.dtype.itemsize, uniques.dtype.itemsize)
+            self.keys = np.insert(np.asarray(self.keys, dtype=f"S{width}"), pos[new], uniques[new].astype(f"S{width}"))
+            self.ids = np.insert(np.asarray(self.ids), pos[new], ids[new])
+            self.order = self._build_order()
+        return ids[inverse.reshape(-1)]
+
+    # ==== Ghi ra đĩa: ghi file tạm rồi os.replace để không hỏng từ điển nếu bị ngắt giữa chừng ====
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        for name in ("keys", "ids", "order"):
+            tmp_path = os.path.join(self.path, f"{name}.tmp.npy")
+            np.save(tmp_path, np.asarray(getattr(self, name)))
+            os.replace(tmp_path, os.path.join(self.path, f"{name}.npy"))
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump({"size": len(self), "key_width": self.keys.dtype.itemsize}, f)
+
+# ==== Chuyển file *_user2id.json / *_item2id.json cũ sang từ điển bền vững ====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default="../data/output", help="Thư mục output của pre_process.py")
+    parser.add_argument("--categories", nargs='+', required=True, help="Danh sách tên category cần chuyển")
+    args = parser.parse_args()
+
+    for cate_name in args.categories:
+        category_output_dir = os.path.join(args.output_dir, cate_name)
+        for kind in ("user", "item"):
+            with open(os.path.join(category_output_dir, f"{cate_name}_{kind}2id.json"), "r") as f:
+                mapping = json.load(f)
+            IdDictionary.from_mapping(os.path.join(category_output_dir, f"{cate_name}_{kind}_dict"), mapping).save()
+        print(f"✅ Migrated ID maps of {cate_name}")
@@ -0,0 +1,101 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+
+# Số user mỗi shard cố định => kết quả không phụ thuộc số worker
+SHARD_SIZE = 100_000
+
+# ==== Index các cặp (user, item) đã tương tác, dạng CSR ====
+# keys = user * num_items + item đã sắp tăng dần (không trùng), indptr[u]:indptr[u+1] là đoạn của user u.
+def build_interaction_index(train_data, test_data, num_items):
+    pairs = np.concatenate([np.asarray(train_data, dtype=np.int64).reshape(-1, 2),
+                            np.asarray(test_data, dtype=np.int64).reshape(-1, 2)])
+    keys = np.unique(pairs[:, 0] * num_items + pairs[:, 1])
+    num_users = int(keys[-1] // num_items) + 1 if len(keys) else 0
+    indptr = np.zeros(num_users + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // num_items, minlength=num_users), out=indptr[1:])
+    return keys, indptr
+
+# ==== Sinh negative cho một shard user bằng rejection sampling theo batch ====
+def sample_shard(users, keys, indptr, num_items, num_negatives, seed):
+    rng = np.random.default_rng(seed)
+    n = len(users)
+    negatives = np.full((n, num_negatives), -1, dtype=np.int32)
+    filled = np.zeros(n, dtype=np.int64)
+
+    degree = indptr[users + 1] - indptr[users]
+    target = np.minimum(num_items - degree, num_negatives)
+
+    # User đã tương tác với hơn nửa catalogue: rejection chậm, lấy trực tiếp từ phần bù
+    dense = np.flatnonzero(degree * 2 > num_items)
+    for r in dense:
+        u = users[r]
+        seen = keys[indptr[u]:indptr[u + 1]] - u * num_items
+        pool = np.setdiff1d(np.arange(num_items), seen, assume_unique=True)
+        negatives[r, :target[r]] = rng.choice(pool, size=target[r], replace=False)
+        filled[r] = target[r]
+
+    active = np.flatnonzero(filled < target)
+    while active.size:
+        need = target[active] - filled[active]
+        width = int(need.max() * 1.1) + 8
+        cand = rng.integers(0, num_items, size=(active.size, width))
+
+        # Bỏ item user đã tương tác
+        query = users[active, None].astype(np.int64) * num_items + cand
+        pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        valid = keys[pos] != query
+
+        # Bỏ item trùng với negative đã chọn hoặc trùng trong cùng lần rút
+        merged = np.concatenate([negatives[active], cand], axis=1)
+        order = np.argsort(merged, axis=1, kind='stable')
+        sorted_merged = np.take_along_axis(merged, order, axis=1)
+        dup_sorted = np.zeros(merged.shape, dtype=bool)
+        dup_sorted[:, 1:] = sorted_merged[:, 1:] == sorted_merged[:, :-1]
+        dup = np.empty_like(dup_sorted)
+        np.put_along_axis(dup, order, dup_sorted, axis=1)
+        valid &= ~dup[:, num_negatives:]
+
+        # Giữ tối đa `need` item hợp lệ đầu tiên của mỗi dòng
+        rank = np.cumsum(valid, axis=1)
+        accept = valid & (rank <= need[:, None])
+        rows, cols = np.nonzero(accept)
+        negatives[active[rows], filled[active[rows]] + rank[rows, cols] - 1] = cand[rows, cols]
+        filled[active] += np.minimum(rank[:, -1], need)
+        active = active[filled[active] < target[active]]
+
+    return negatives
+
+# Index dùng chung cho các worker, gán một lần qua initializer thay vì pickle theo từng task
+_shared_index = None
+
+def _init_worker(keys, indptr, num_items, num_negatives):
+    global _shared_index
+    _shared_index = (keys, indptr, num_items, num_negatives)
+
+def _sample_shard_task(args):
+    users, seed = args
+    keys, indptr, num_items, num_negatives = _shared_index
+    return sample_shard(users, keys, indptr, num_items, num_negatives, seed)
+
+# ==== Sinh negative sample cho test ====
+# Trả về ma trận int32 (số dòng test, num_negatives); dòng của user không đủ item được đệm -1.
+def generate_negative_samples(train_data, test_data, num_items, num_negatives=99, seed=42, workers=1):
+    test_data = np.asarray(test_data, dtype=np.int64).reshape(-1, 2)
+    keys, indptr = build_interaction_index(train_data, test_data, num_items)
+
+    shards = np.array_split(test_data[:, 0], max(1, -(-len(test_data) // SHARD_SIZE)))
+    seeds = np.random.SeedSequence(seed).spawn(len(shards))
+    tasks = list(zip(shards, seeds))
+    initargs = (keys, indptr, num_items, num_negatives)
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            results = list(tqdm(executor.map(_sample_shard_task, tasks), total=len(tasks), desc="Generating negatives"))
+    else:
+        _init_worker(*initargs)
+        results = [_sample_shard_task(task) for task in tqdm(tasks, desc="Generating negatives")]
+
+    if not results:
+        return np.empty((0, num_negatives), dtype=np.int32)
+    return np.concatenate(results)
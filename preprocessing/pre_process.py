@@ -1,11 +1,28 @@
 import os
+import io
+import sys
 import json
+import time
 import argparse
 import random
+import traceback
 import pandas as pd
 import numpy as np
-from tqdm import tqdm
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import redirect_stdout, redirect_stderr
+
+from negative_sampling import generate_negative_samples
+from binary_format import save_binary_output, BINARY_FILES, TEXT_FILES, MANIFEST_FILE
+from id_dictionary import IdDictionary
+from pandas._libs.hashtable import ObjectVector, PyObjectHashTable
+
+# Module đo thời gian/bộ nhớ dùng chung với helper/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "helper"))
+from instrumentation import RunReport, default_report_file
+from build_cache import BuildCache
+
+LOAD_CHUNK_SIZE = 500_000
 
 # ==== Build mapping từ user_id và item_id gốc sang số nguyên ====
 def build_id_maps(df_list):
@@ -25,50 +42,51 @@ def convert_dataframe(df, user2id, item2id):
     df = df[df['parent_asin'].isin(item2id)]
     df['user'] = df['user_id'].map(user2id)
     df['item'] = df['parent_asin'].map(item2id)
-    return df[['user', 'item']]
+    columns = ['user', 'item', 'timestamp'] if 'timestamp' in df.columns else ['user', 'item']
+    return df[columns]
+
+# ==== Convert bằng từ điển ID bền vững: ID cũ giữ nguyên, ID mới được cấp số tiếp theo ====
+def convert_with_dictionaries(df, user_dict, item_dict):
+    converted = pd.DataFrame({
+        'user': user_dict.add(df['user_id'].to_numpy()),
+        'item': item_dict.add(df['parent_asin'].to_numpy()),
+    })
+    if 'timestamp' in df.columns:
+        converted['timestamp'] = df['timestamp'].to_numpy()
+    return converted
 
 # ==== Chia train/test theo kiểu leave-last-one-out ====
-def split_train_test(df, shuffle=True):
-    if shuffle:
-        df = df.sample(frac=1, random_state=42).reset_index(drop=True)
-
-    user_group = df.groupby('user')
-    train_data = []
-    test_data = []
-
-    for user, group in user_group:
-        items = group['item'].tolist()
-        if len(items) < 2:
-            continue
-        train_items = items[:-1]
-        test_item = items[-1]
-        for item in train_items:
-            train_data.append((user, item))
-        test_data.append((user, test_item))
+# Trả về 2 mảng int32 dạng (n, 2) gồm các cặp (user, item), sắp theo user.
+# - shuffle: xáo trộn tương tác (cố định random_state) trước khi lấy item cuối của mỗi user làm test
+# - by_time: sắp tương tác của mỗi user theo timestamp, item mới nhất làm test
+# User có ít hơn 2 tương tác bị bỏ qua.
+# df: DataFrame hoặc dict các mảng cột 'user', 'item' (và 'timestamp' nếu by_time).
+def split_train_test(df, shuffle=True, by_time=False, random_state=42):
+    users = np.asarray(df['user'], dtype=np.int32)
+    items = np.asarray(df['item'], dtype=np.int32)
+    n = len(users)
 
-    return train_data, test_data
+    # Cùng hoán vị với df.sample(frac=1, random_state=random_state)
+    order = np.random.RandomState(random_state).permutation(n) if shuffle else np.arange(n)
+    if by_time:
+        timestamps = np.asarray(df['timestamp'])
+        order = order[np.lexsort((timestamps[order], users[order]))]
+    else:
+        order = order[np.argsort(users[order], kind='stable')]
+    users = users[order]
+    items = items[order]
 
-# ==== Sinh negative sample cho test ====
-def generate_negative_samples(train_data, test_data, all_items, num_negatives=99):
-    interacted = defaultdict(set)
-    for u, i in train_data:
-        interacted[u].add(i)
-    for u, i in test_data:
-        interacted[u].add(i)
-
-    all_items_array = np.array(list(all_items))
-    test_negative = []
-    
-    for u, pos_i in tqdm(test_data, desc="Generating negatives"):
-        user_items = interacted[u]
-        mask = np.isin(all_items_array, list(user_items), invert=True)
-        negatives_pool = all_items_array[mask]
-        if len(negatives_pool) < num_negatives:
-            negatives = negatives_pool.tolist()
-        else:
-            negatives = np.random.choice(negatives_pool, size=num_negatives, replace=False).tolist()
-        test_negative.append((u, pos_i, negatives))
-    return test_negative
+    # Biên của từng nhóm user trên mảng đã sắp
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]]) if n else np.empty(0, dtype=np.int64)
+    counts = np.diff(np.r_[starts, n])
+
+    is_test = np.zeros(n, dtype=bool)
+    is_test[(starts + counts - 1)[counts >= 2]] = True
+    is_train = np.repeat(counts >= 2, counts) & ~is_test
+
+    train_data = np.column_stack((users[is_train], items[is_train]))
+    test_data = np.column_stack((users[is_test], items[is_test]))
+    return train_data, test_data
 
 # ==== Lưu kết quả ra từng file theo category ====
 def save_output_per_category(cate_name, train_data, test_data, test_negative, output_dir):
@@ -83,8 +101,8 @@ def save_output_per_category(cate_name, train_data, test_data, test_negative, ou
             f.write(f"{u}\t{i}\n")
 
     with open(os.path.join(output_dir, f"{cate_name}.test.negative"), "w") as f:
-        for u, pos_i, negatives in test_negative:
-            line = f"{u}\t{pos_i}" + "".join([f"\t{neg_i}" for neg_i in negatives]) + "\n"
+        for (u, pos_i), negatives in zip(test_data, test_negative):
+            line = f"{u}\t{pos_i}" + "".join([f"\t{neg_i}" for neg_i in negatives if neg_i >= 0]) + "\n"
             f.write(line)
 
 # ==== Lưu ánh xạ ID gốc <-> ID số nguyên ====
@@ -100,28 +118,242 @@ def load_csv_file(input_dir, cate):
     cate_path = os.path.join(input_dir, cate, f"{cate}.csv")
     return pd.read_csv(cate_path)
 
+# ==== Load CSV theo chunk và mã hoá ID ngay khi đọc (tiết kiệm bộ nhớ) ====
+# Chỉ đọc user_id, parent_asin (và timestamp nếu with_timestamp). ID gốc của mỗi chunk được tra/thêm vào một
+# hashtable duy nhất cho cả lần load (hashtable của pd.factorize, mã tạm = thứ tự xuất hiện lần đầu), nên chi phí
+# tỉ lệ với số dòng chứ không phải số chunk x số ID đã gặp. Cuối cùng các ID gốc được sắp xếp một lần để đổi
+# mã tạm thành ID giống hệt build_id_maps + convert_dataframe (ID = thứ tự sắp xếp của ID gốc).
+# Trả về (users, items, timestamps hoặc None, user_ids, item_ids): users/items là mảng int32,
+# user_ids/item_ids là mảng ID gốc đã sắp xếp (user_ids[u] là user_id gốc của user u).
+def load_interactions(input_dir, cate, with_timestamp=False, chunksize=LOAD_CHUNK_SIZE):
+    cate_path = os.path.join(input_dir, cate, f"{cate}.csv")
+    columns = ["user_id", "parent_asin"] + (["timestamp"] if with_timestamp else [])
+    seen = {column: (PyObjectHashTable(), []) for column in ["user_id", "parent_asin"]}
+    codes = {"user_id": [], "parent_asin": []}
+    timestamp_chunks = []
+
+    def encode_chunk(column, values):
+        table, new_values = seen[column]
+        # ID mới của chunk được thêm vào uniques với mã tiếp theo sau các ID đã gặp; giá trị thiếu -> -1
+        uniques = ObjectVector()
+        chunk_codes = table.get_labels(np.asarray(values, dtype=object), uniques, len(table), -1)
+        new_values.append(uniques.to_array())
+        return chunk_codes.astype(np.int32), chunk_codes >= 0
+
+    for chunk in pd.read_csv(cate_path, usecols=columns, chunksize=chunksize,
+                             dtype={"user_id": str, "parent_asin": str}):
+        user_codes, user_valid = encode_chunk("user_id", chunk["user_id"])
+        item_codes, item_valid = encode_chunk("parent_asin", chunk["parent_asin"])
+        valid = user_valid & item_valid
+        codes["user_id"].append(user_codes[valid])
+        codes["parent_asin"].append(item_codes[valid])
+        if with_timestamp:
+            timestamp_chunks.append(chunk["timestamp"].to_numpy()[valid])
+
+    def finish(column):
+        values = np.concatenate(seen.pop(column)[1] or [np.empty(0, dtype=object)])
+        # sorted() của Python so sánh chuỗi nhanh hơn np.argsort trên mảng object, cùng thứ tự
+        order = np.fromiter(sorted(range(len(values)), key=values.__getitem__), dtype=np.int64, count=len(values))
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        chunks = codes.pop(column)
+        result = np.empty(sum(map(len, chunks)), dtype=np.int32)
+        start = 0
+        while chunks:
+            chunk = chunks.pop(0)
+            result[start:start + len(chunk)] = rank[chunk]
+            start += len(chunk)
+        return result, values[order]
+
+    users, user_ids = finish("user_id")
+    items, item_ids = finish("parent_asin")
+    timestamps = np.concatenate(timestamp_chunks) if timestamp_chunks else None
+    return users, items, timestamps, user_ids, item_ids
+
+# ==== Danh sách file đầu ra của một category ====
+def category_outputs(output_dir, cate_name, binary=False, persistent_ids=False):
+    output_files = list(BINARY_FILES.values()) + [MANIFEST_FILE] if binary else list(TEXT_FILES.values())
+    if persistent_ids:
+        output_files += [os.path.join(f"{{cate}}_{kind}_dict", f"{name}.npy")
+                         for kind in ["user", "item"] for name in ["keys", "ids", "order"]]
+    else:
+        output_files += ["{cate}_user2id.json", "{cate}_item2id.json"]
+    return [os.path.join(output_dir, cate_name, f.format(cate=cate_name)) for f in output_files]
+
 # ==== Pipeline xử lý cho từng category ====
-def preprocess_category(input_dir, output_dir, cate_name, shuffle):
+# report: RunReport ghi thời gian, số dòng, số byte, bộ nhớ của từng stage (mặc định: không lưu)
+def preprocess_category(input_dir, output_dir, cate_name, shuffle, by_time=False,
+                        num_negatives=99, seed=42, neg_workers=1, binary=False, persistent_ids=False, report=None):
     print(f"\n🚀 Processing category: {cate_name}")
+    report = report or RunReport("pre_process")
 
-    df = load_csv_file(input_dir, cate_name)
+    with report.stage("load_csv", category=cate_name) as stage:
+        stage.read(os.path.join(input_dir, cate_name, f"{cate_name}.csv"))
+        users, items, timestamps, user_ids, item_ids = load_interactions(input_dir, cate_name, with_timestamp=by_time)
+        stage.rows_out = len(users)
+    category_output_dir = os.path.join(output_dir, cate_name)
 
-    user2id, item2id = build_id_maps([df])
-    converted_df = convert_dataframe(df, user2id, item2id)
-    train_data, test_data = split_train_test(converted_df, shuffle=shuffle)
-    all_items = set(item2id.values())
-    test_negative = generate_negative_samples(train_data, test_data, all_items)
+    with report.stage("convert_ids", category=cate_name) as stage:
+        stage.rows_in = len(users)
+        if persistent_ids:
+            # Chỉ cần tra các ID gốc unique, sau đó ánh xạ mã của từng dòng qua mảng kết quả
+            user_dict = IdDictionary.load(os.path.join(category_output_dir, f"{cate_name}_user_dict"))
+            item_dict = IdDictionary.load(os.path.join(category_output_dir, f"{cate_name}_item_dict"))
+            users = user_dict.add(user_ids).astype(np.int32)[users]
+            items = item_dict.add(item_ids).astype(np.int32)[items]
+            num_users, num_items = len(user_dict), len(item_dict)
+        else:
+            num_users, num_items = len(user_ids), len(item_ids)
+        stage.rows_out = len(users)
 
-    category_output_dir = os.path.join(output_dir, cate_name)
-    save_output_per_category(cate_name, train_data, test_data, test_negative, category_output_dir)
-    save_mappings(user2id, item2id, category_output_dir, cate_name)
+    with report.stage("split_train_test", category=cate_name) as stage:
+        stage.rows_in = len(users)
+        interactions = {"user": users, "item": items, "timestamp": timestamps}
+        train_data, test_data = split_train_test(interactions, shuffle=shuffle, by_time=by_time)
+        stage.rows_out = len(train_data) + len(test_data)
+        num_rows = len(users)
+        del interactions, users, items, timestamps
+
+    with report.stage("negative_sampling", category=cate_name) as stage:
+        stage.rows_in = len(test_data)
+        test_negative = generate_negative_samples(train_data, test_data, num_items,
+                                                  num_negatives=num_negatives, seed=seed, workers=neg_workers)
+        stage.rows_out = int((test_negative >= 0).sum())
+
+    with report.stage("save_output", category=cate_name) as stage:
+        stage.rows_in = len(train_data) + len(test_data)
+        if binary:
+            save_binary_output(cate_name, train_data, test_data, test_negative, category_output_dir,
+                               num_users=num_users, num_items=num_items)
+        else:
+            save_output_per_category(cate_name, train_data, test_data, test_negative, category_output_dir)
+
+        if persistent_ids:
+            user_dict.save()
+            item_dict.save()
+        else:
+            save_mappings(dict(zip(user_ids.tolist(), range(len(user_ids)))),
+                          dict(zip(item_ids.tolist(), range(len(item_ids)))), category_output_dir, cate_name)
+        stage.rows_out = stage.rows_in
+        stage.wrote(*category_outputs(output_dir, cate_name, binary, persistent_ids))
 
     print(f"✅ Done with category: {cate_name}")
+    return {"rows": num_rows, "train": len(train_data), "test": len(test_data)}
+
+# ==== Chạy một category: bắt lỗi, đo thời gian, gom log (nếu capture_log) và số liệu từng stage ====
+def run_category(cate_name, options, capture_log=False, profile_stage=None, profile_dir=None):
+    log = io.StringIO()
+    start = time.perf_counter()
+    report = RunReport("pre_process", profile_stage, profile_dir)
+    result = {"category": cate_name, "status": "ok", "rows": 0, "train": 0, "test": 0, "log": "", "error": None}
+    try:
+        if capture_log:
+            with redirect_stdout(log), redirect_stderr(log):
+                result.update(preprocess_category(cate_name=cate_name, report=report, **options))
+        else:
+            result.update(preprocess_category(cate_name=cate_name, report=report, **options))
+    except Exception:
+        result["status"] = "failed"
+        result["error"] = traceback.format_exc()
+    result["seconds"] = time.perf_counter() - start
+    result["log"] = log.getvalue()
+    result["stages"] = report.stages
+    return result
+
+# ==== Tìm các category cần chạy lại: CSV đầu vào hoặc tham số thay đổi, hoặc thiếu file đầu ra ====
+# Trả về {category: (lý do, fingerprint)}; force=True coi mọi category là cần chạy lại.
+def find_stale_categories(cache, input_dir, output_dir, categories, params, force=False):
+    stale = {}
+    for cate_name in categories:
+        reason, fingerprint = cache.check(cate_name, [os.path.join(input_dir, cate_name, f"{cate_name}.csv")], params,
+                                          category_outputs(output_dir, cate_name, params["binary"],
+                                                           params["persistent_ids"]), force)
+        if reason:
+            stale[cate_name] = (reason, fingerprint)
+    return stale
+
+# ==== In bảng tổng kết thời gian và số dòng theo category ====
+def print_summary(results, wall_time):
+    print(f"\n{'Category':<40}{'Status':<8}{'Time (s)':>10}{'Rows':>12}{'Train':>12}{'Test':>10}")
+    for r in results:
+        print(f"{r['category']:<40}{r['status']:<8}{r['seconds']:>10.1f}{r['rows']:>12}{r['train']:>12}{r['test']:>10}")
+    failed = [r["category"] for r in results if r["status"] == "failed"]
+    print(f"⏱️  Total wall time: {wall_time:.1f}s, {len(results) - len(failed)}/{len(results)} categories OK")
+    if failed:
+        print(f"❌ Failed: {', '.join(failed)}")
 
 # ==== Hàm chính xử lý toàn bộ ====
-def main(input_dir, output_dir, categories, shuffle):
+# workers > 1: xử lý nhiều category song song bằng process pool, log của mỗi category được in gộp khi xong.
+# Cuối lần chạy, số liệu từng stage được lưu vào report_file (mặc định output_dir/reports/pre_process_<thời gian>.json).
+# profile_stage: chạy stage có tên này dưới cProfile (file .prof lưu cạnh report).
+# Category có CSV và tham số không đổi kể từ lần build thành công trước (output_dir/.build_cache.json) được bỏ qua;
+# force=True chạy lại tất cả, dry_run=True chỉ liệt kê các category cần chạy lại.
+def main(input_dir, output_dir, categories, shuffle, by_time=False, num_negatives=99, seed=42, neg_workers=1,
+         binary=False, workers=1, persistent_ids=False, report_file=None, profile_stage=None, force=False,
+         dry_run=False):
+    options = dict(input_dir=input_dir, output_dir=output_dir, shuffle=shuffle, by_time=by_time,
+                   num_negatives=num_negatives, seed=seed, neg_workers=neg_workers, binary=binary,
+                   persistent_ids=persistent_ids)
+    # neg_workers không ảnh hưởng kết quả nên không nằm trong fingerprint
+    params = dict(shuffle=shuffle, by_time=by_time, num_negatives=num_negatives, seed=seed, binary=binary,
+                  persistent_ids=persistent_ids)
+    cache = BuildCache.for_folder(output_dir)
+    stale = find_stale_categories(cache, input_dir, output_dir, categories, params, force)
+
     for cate_name in categories:
-        preprocess_category(input_dir, output_dir, cate_name, shuffle)
+        reason = stale[cate_name][0] if cate_name in stale else None
+        print(f"{'🔄' if reason else '✔️ '} {cate_name}: {reason or 'up to date'}")
+    if dry_run:
+        return []  # Không ghi build cache: dry run không thay đổi trạng thái
+    cache.save()
+
+    report_file = report_file or default_report_file(output_dir, "pre_process")
+    report = RunReport("pre_process", profile_stage, os.path.dirname(report_file))
+    start = time.perf_counter()
+    results = [{"category": cate_name, "status": "skipped", "rows": 0, "train": 0, "test": 0, "seconds": 0.0,
+                "stages": [], "error": None} for cate_name in categories if cate_name not in stale]
+
+    def finish(result):
+        if result["status"] == "ok":
+            cache.record(result["category"], stale[result["category"]][1],
+                         category_outputs(output_dir, result["category"], binary, persistent_ids))
+        else:
+            cache.invalidate(result["category"])
+        cache.save()
+        results.append(result)
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_category, cate_name, options, True, profile_stage, report.profile_dir):
+                       cate_name for cate_name in stale}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    # Một worker chết đột ngột (vd. bị OOM kill): mọi category chưa xong của pool bị đánh dấu lỗi,
+                    # các category còn lại vẫn được tổng kết và report vẫn được ghi
+                    result = {"category": futures[future], "status": "failed", "rows": 0, "train": 0, "test": 0,
+                              "seconds": 0.0, "log": "", "stages": [],
+                              "error": f"Worker process died before finishing the category: {e!r}\n"}
+                print(f"\n===== [{result['category']}] {result['status']} in {result['seconds']:.1f}s =====")
+                print(result["log"], end="")
+                if result["error"]:
+                    print(result["error"], end="")
+                finish(result)
+    else:
+        for cate_name in stale:
+            result = run_category(cate_name, options, False, profile_stage, report.profile_dir)
+            if result["error"]:
+                print(result["error"], end="")
+            finish(result)
+
+    order = {cate_name: i for i, cate_name in enumerate(categories)}
+    results.sort(key=lambda r: order[r["category"]])
+    for result in results:
+        report.extend(result["stages"])
+    print_summary(results, time.perf_counter() - start)
+    report.save(report_file)
+    return results
 
 # ==== Gọi script từ dòng lệnh ====
 if __name__ == "__main__":
@@ -130,9 +362,28 @@ if __name__ == "__main__":
     parser.add_argument("--output_dir", default="../data/output", help="Thư mục lưu dữ liệu đầu ra")
     parser.add_argument("--categories", nargs='+', required=True, help="Danh sách tên category để xử lý")
     parser.add_argument("--shuffle", action="store_true", help="Có shuffle trước khi chia train/test không")
+    parser.add_argument("--by_time", action="store_true", help="Chia train/test theo timestamp (item mới nhất làm test)")
+    parser.add_argument("--num_negatives", type=int, default=99, help="Số negative sample cho mỗi user test")
+    parser.add_argument("--seed", type=int, default=42, help="Seed cho negative sampling")
+    parser.add_argument("--neg_workers", type=int, default=1, help="Số process dùng để sinh negative sample")
+    parser.add_argument("--binary", action="store_true", help="Lưu train/test/negative dạng mảng int32 .npy thay vì text")
+    parser.add_argument("--workers", type=int, default=1, help="Số category xử lý song song")
+    parser.add_argument("--persistent_ids", action="store_true",
+                        help="Dùng từ điển ID append-only (giữ nguyên ID cũ qua các lần chạy) thay cho *_user2id.json")
+    parser.add_argument("--report", default=None,
+                        help="File JSON lưu số liệu từng stage (mặc định output_dir/reports/pre_process_<thời gian>.json)")
+    parser.add_argument("--profile_stage", default=None,
+                        choices=["load_csv", "convert_ids", "split_train_test", "negative_sampling", "save_output"],
+                        help="Chạy stage này dưới cProfile và lưu file .prof cạnh report")
+    parser.add_argument("--force", action="store_true", help="Chạy lại mọi category, kể cả khi đầu vào không đổi")
+    parser.add_argument("--dry_run", action="store_true", help="Chỉ liệt kê các category cần chạy lại")
     args = parser.parse_args()
 
-    main(args.input_dir, args.output_dir, args.categories, args.shuffle)
+    results = main(args.input_dir, args.output_dir, args.categories, args.shuffle, args.by_time,
+                   args.num_negatives, args.seed, args.neg_workers, args.binary, args.workers,
+                   args.persistent_ids, args.report, args.profile_stage, args.force, args.dry_run)
+    if any(r["status"] == "failed" for r in results):
+        sys.exit(1)
 
 # === RUN ===: python preprocess.py --input_dir data/input --output_dir data/output --categories Gift_Cards Cell_Phones_and_Accessories --shuffle
 # python preprocess.py --categories Gift_Cards Cell_Phones_and_Accessories --shuffle
\ No newline at end of file
@@ -0,0 +1,280 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+
+from binary_format import MANIFEST_FILE, TEXT_FILES, load_binary_output
+
+# Số cặp (dòng, láng giềng) cùng xuất hiện tối đa cho một block, giới hạn bộ nhớ của tích sparse (~16 byte/cặp)
+BLOCK_PAIRS = 20_000_000
+# "dot": tích vô hướng, dùng cho ma trận có trọng số đã chuẩn hoá L2 (vd. TF-IDF của content_based_tfidf.py)
+METRICS = ["cosine", "jaccard", "dot"]
+
+CSR_FILES = {"indptr": "{cate}.train_csr.indptr.npy", "indices": "{cate}.train_csr.indices.npy"}
+TOPK_FILES = {"indices": "{cate}.{kind}_topk.indices.npy", "scores": "{cate}.{kind}_topk.scores.npy"}
+TOPK_MANIFEST = "{cate}.{kind}_topk.json"
+
+# ==== Đọc cặp (user, item) train từ output của pre_process.py (nhị phân nếu có manifest, không thì text) ====
+# Trả về (train int32 (n, 2), num_users, num_items).
+def load_train_pairs(category_dir, cate_name):
+    if os.path.exists(os.path.join(category_dir, MANIFEST_FILE.format(cate=cate_name))):
+        manifest, arrays = load_binary_output(category_dir, cate_name)
+        return np.asarray(arrays["train"]), manifest["num_users"], manifest["num_items"]
+
+    def read_pairs(name):
+        return pd.read_csv(os.path.join(category_dir, TEXT_FILES[name].format(cate=cate_name)), sep="\t",
+                           header=None, names=["user", "item"], dtype=np.int32).to_numpy()
+
+    train, test = read_pairs("train"), read_pairs("test")
+    both = np.concatenate([train, test])
+    return train, int(both[:, 0].max(initial=-1)) + 1, int(both[:, 1].max(initial=-1)) + 1
+
+# ==== Ma trận user-item dạng CSR (giá trị 1 cho mỗi cặp đã tương tác, cặp trùng được gộp) ====
+def build_interaction_matrix(train_data, num_users, num_items):
+    train_data = np.asarray(train_data, dtype=np.int64).reshape(-1, 2)
+    keys = np.unique(train_data[:, 0] * num_items + train_data[:, 1])
+    indptr = np.zeros(num_users + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // num_items, minlength=num_users), out=indptr[1:])
+    indices = (keys % num_items).astype(np.int32)
+    return sp.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(num_users, num_items))
+
+# ==== Lưu / đọc CSR dạng 2 file .npy (memory-map được) ====
+def save_csr(matrix, category_dir, cate_name):
+    for name, array in [("indptr", matrix.indptr), ("indices", matrix.indices)]:
+        np.save(os.path.join(category_dir, CSR_FILES[name].format(cate=cate_name)), array)
+
+def load_csr(category_dir, cate_name, num_items, mmap_mode="r"):
+    indptr, indices = [np.load(os.path.join(category_dir, CSR_FILES[name].format(cate=cate_name)),
+                               mmap_mode=mmap_mode) for name in ["indptr", "indices"]]
+    data = np.ones(len(indices), dtype=np.float32)
+    return sp.csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, num_items))
+
+# ==== Top-K láng giềng của một block dòng [start, end) ====
+# rows: ma trận CSR (n, m) nhị phân (hoặc có trọng số với metric "dot"), columns = rows.T ở dạng CSR,
+# degree: số phần tử khác 0 của mỗi dòng.
+# Tích rows[start:end] @ columns giữ dạng sparse (chỉ các cặp có chung ít nhất một cột), nên chi phí tỉ lệ với
+# số cặp cùng xuất hiện chứ không với n. Bỏ chính nó; láng giềng có độ tương đồng 0 không bao giờ được chọn.
+# rescore=True khi columns đã bị cắt bớt (prune_postings): tích chỉ dùng để chọn top-k ứng viên, điểm của chúng
+# được tính lại chính xác từ rows rồi sắp lại.
+# Trả về (indices int32, scores float32) dạng (end - start, k), đệm -1 / 0 nếu không đủ láng giềng.
+def topk_block(rows, columns, degree, start, end, k, metric, rescore=False):
+    overlap = (rows[start:end] @ columns).tocoo()
+    row, col, value = overlap.row, overlap.col, overlap.data
+    keep = col != row + start
+    row, col, value = row[keep], col[keep], value[keep]
+    indices, scores = select_topk(row, col, pair_scores(value, degree[row + start], degree[col], metric),
+                                  end - start, k)
+    if not rescore:
+        return indices, scores
+
+    row, rank = np.nonzero(indices >= 0)
+    col = indices[row, rank]
+    value = np.asarray(rows[row + start].multiply(rows[col]).sum(axis=1)).ravel()
+    return select_topk(row, col, pair_scores(value, degree[row + start], degree[col], metric), end - start, k)
+
+# ==== Độ tương đồng từ tích vô hướng value của 2 dòng có row_degree, col_degree phần tử khác 0 ====
+def pair_scores(value, row_degree, col_degree, metric):
+    if metric == "cosine":
+        return value / np.sqrt(row_degree * col_degree)
+    if metric == "jaccard":
+        return value / (row_degree + col_degree - value)
+    return value
+
+# ==== Bỏ trước các bộ ba chắc chắn nằm ngoài top-k của dòng, để lexsort (chậm) chỉ chạy trên ~k bộ mỗi dòng ====
+# Điểm float32 được đổi thành uint32 cùng thứ tự, ghép với dòng thành một khoá uint64 (dòng tăng dần, điểm giảm
+# dần); một lần np.sort cho điểm thứ k của mỗi dòng. Giữ mọi bộ có điểm >= ngưỡng đó (kể cả các điểm hoà),
+# nên select_topk cho kết quả giống hệt khi không lọc.
+def prefilter_topk(row, col, scores, num_rows, k):
+    bits = scores.astype(np.float32).view(np.uint32)
+    key = np.where(bits >> np.uint32(31), ~bits, bits | np.uint32(0x80000000))
+    combined = np.sort((row.astype(np.uint64) << np.uint64(32)) | (~key).astype(np.uint64))
+
+    counts = np.bincount(row, minlength=num_rows)
+    row_start = np.zeros(num_rows, dtype=np.int64)
+    np.cumsum(counts[:-1], out=row_start[1:])
+    full = counts > k
+    threshold = np.zeros(num_rows, dtype=np.uint32)
+    threshold[full] = ~(combined[row_start[full] + k - 1] & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    keep = key >= threshold[row]
+    return row[keep], col[keep], scores[keep]
+
+# ==== Giữ k cột điểm cao nhất của mỗi dòng từ các bộ ba (dòng, cột, điểm) dạng COO ====
+# Sắp theo dòng, điểm giảm dần, hoà thì cột nhỏ trước => kết quả không phụ thuộc cách chia block.
+# Trả về (indices int32, scores float32) dạng (num_rows, k), đệm -1 / 0 nếu dòng không đủ k cột.
+def select_topk(row, col, scores, num_rows, k):
+    if len(row) > num_rows * k:
+        row, col, scores = prefilter_topk(row, col, scores, num_rows, k)
+    order = np.lexsort((col, -scores, row))
+    row, col, scores = row[order], col[order], scores[order]
+    row_start = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row, minlength=num_rows), out=row_start[1:])
+    rank = np.arange(len(row)) - row_start[row]
+    top = rank < k
+
+    indices = np.full((num_rows, k), -1, dtype=np.int32)
+    values = np.zeros((num_rows, k), dtype=np.float32)
+    indices[row[top], rank[top]] = col[top]
+    values[row[top], rank[top]] = scores[top]
+    return indices, values
+
+# ==== Chia các dòng thành block sao cho số cặp cùng xuất hiện của mỗi block không vượt quá block_pairs ====
+# Số cặp của dòng i ≤ tổng số dòng chứa mỗi cột của i, tính rẻ trước khi nhân (chỉ dùng vị trí khác 0,
+# không dùng giá trị, để đúng cả với ma trận có trọng số). max_postings: xem prune_postings.
+def plan_blocks(rows, block_pairs=BLOCK_PAIRS, block_size=None, max_postings=None):
+    n = rows.shape[0]
+    if block_size:
+        return [(start, min(start + block_size, n)) for start in range(0, n, block_size)]
+    column_count = np.bincount(rows.indices, minlength=rows.shape[1]).astype(np.float64)
+    if max_postings:
+        column_count = np.minimum(column_count, max_postings)
+    pattern = sp.csr_matrix((np.ones(len(rows.indices)), rows.indices, rows.indptr), shape=rows.shape)
+    return split_by_cost(pattern @ column_count, block_pairs)
+
+# ==== Chia các dòng liên tiếp thành block có tổng chi phí (số cặp ước lượng) không vượt quá budget ====
+# Dòng có chi phí lớn hơn budget vẫn nằm riêng một block.
+def split_by_cost(costs, budget=BLOCK_PAIRS):
+    n = len(costs)
+    cumulative = np.cumsum(costs)
+    blocks, start = [], 0
+    while start < n:
+        offset = cumulative[start - 1] if start else 0.0
+        end = max(start + 1, int(np.searchsorted(cumulative, offset + budget, side="right")))
+        blocks.append((start, min(end, n)))
+        start = end
+    return blocks
+
+# ==== Chỉ giữ max_postings dòng có giá trị lớn nhất trong mỗi cột (mỗi dòng của columns = rows.T) ====
+# Cột phổ biến (vd. từ xuất hiện ở nhiều item) tạo ra số cặp tăng theo bình phương số dòng chứa nó; sau khi cắt,
+# số cặp của một dòng ≤ số phần tử khác 0 của nó x max_postings. Cặp chỉ chung các cột bị cắt có thể bị bỏ sót.
+def prune_postings(columns, max_postings):
+    counts = np.diff(columns.indptr)
+    row = np.repeat(np.arange(columns.shape[0]), counts)
+    order = np.lexsort((columns.indices, -columns.data, row))
+    rank = np.arange(len(order)) - columns.indptr[row]
+    keep = order[rank < max_postings]
+    keep.sort()  # giữ thứ tự cột trong từng dòng
+    indptr = np.zeros(columns.shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.minimum(counts, max_postings), out=indptr[1:])
+    return sp.csr_matrix((columns.data[keep], columns.indices[keep], indptr), shape=columns.shape)
+
+# ==== Worker: nhận ma trận một lần qua initializer thay vì pickle theo từng block ====
+_shared_matrix = None
+
+def _init_worker(rows, k, metric, max_postings=None):
+    global _shared_matrix
+    rows = rows.tocsr()
+    degree = np.diff(rows.indptr).astype(np.float32)
+    columns = rows.T.tocsr()
+    if max_postings:
+        columns = prune_postings(columns, max_postings)
+    _shared_matrix = (rows, columns, degree, k, metric, bool(max_postings))
+
+def _topk_block_task(bounds):
+    rows, columns, degree, k, metric, rescore = _shared_matrix
+    return topk_block(rows, columns, degree, bounds[0], bounds[1], k, metric, rescore)
+
+# ==== Top-K tương đồng giữa các dòng của ma trận, tính theo block trên nhiều process ====
+# Kết quả được ghi thẳng vào 2 file .npy qua memory-map, nên không cần giữ ma trận tương đồng (n, n) trong RAM.
+# block_size: số dòng cố định mỗi block (mặc định chia theo số cặp cùng xuất hiện, xem plan_blocks).
+# max_postings: tìm ứng viên trên các cột đã cắt bớt (prune_postings) rồi tính lại điểm chính xác (gần đúng, nhanh).
+def topk_similarity(rows, k, metric, indices_file, scores_file, block_size=None, workers=1, desc=None,
+                    max_postings=None):
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {METRICS}, got {metric!r}")
+    n = rows.shape[0]
+    blocks = plan_blocks(rows, block_size=block_size, max_postings=max_postings)
+
+    indices = np.lib.format.open_memmap(indices_file + ".tmp", mode="w+", dtype=np.int32, shape=(n, k))
+    scores = np.lib.format.open_memmap(scores_file + ".tmp", mode="w+", dtype=np.float32, shape=(n, k))
+
+    initargs = (rows, k, metric, max_postings)
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            for (start, end), (block_indices, block_scores) in zip(blocks, tqdm(
+                    executor.map(_topk_block_task, blocks), total=len(blocks), desc=desc)):
+                indices[start:end], scores[start:end] = block_indices, block_scores
+    else:
+        _init_worker(*initargs)
+        for start, end in tqdm(blocks, desc=desc):
+            indices[start:end], scores[start:end] = _topk_block_task((start, end))
+
+    indices.flush()
+    scores.flush()
+    del indices, scores
+    os.replace(indices_file + ".tmp", indices_file)
+    os.replace(scores_file + ".tmp", scores_file)
+
+# ==== Recall của top-K đã tính (indices) so với top-K chính xác trên sample_size dòng ngẫu nhiên có phần tử ====
+# Dùng để đo chất lượng khi tính với max_postings (prune_postings). Top-K chính xác của các dòng mẫu được tính
+# trên toàn bộ columns, cùng thứ tự hoà như select_topk. Trả về (recall, số dòng mẫu).
+def sample_recall(rows, indices, k, metric, sample_size=200, seed=42):
+    rows = rows.tocsr()
+    degree = np.diff(rows.indptr).astype(np.float32)
+    candidates = np.flatnonzero(degree > 0)
+    if len(candidates) == 0:
+        return 1.0, 0
+    rng = np.random.default_rng(seed)
+    sample = np.sort(rng.choice(candidates, min(sample_size, len(candidates)), replace=False))
+
+    overlap = (rows[sample] @ rows.T.tocsr()).tocoo()
+    row, col, value = overlap.row, overlap.col, overlap.data
+    keep = col != sample[row]
+    row, col, value = row[keep], col[keep], value[keep]
+    exact, _ = select_topk(row, col, pair_scores(value, degree[sample[row]], degree[col], metric), len(sample), k)
+
+    found = np.asarray(indices[sample])
+    hits = sum(np.isin(exact[i][exact[i] >= 0], found[i]).sum() for i in range(len(sample)))
+    total = int((exact >= 0).sum())
+    return (hits / total if total else 1.0), len(sample)
+
+# ==== Đọc kết quả top-K (memory-map) ====
+def load_topk(category_dir, cate_name, kind="item", mmap_mode="r"):
+    with open(os.path.join(category_dir, TOPK_MANIFEST.format(cate=cate_name, kind=kind)), "r") as f:
+        manifest = json.load(f)
+    arrays = {name: np.load(os.path.join(category_dir, file_name), mmap_mode=mmap_mode)
+              for name, file_name in manifest["files"].items()}
+    return manifest, arrays
+
+# ==== Pipeline cho một category: CSR user-item + top-K item-item (và user-user nếu cần) ====
+def build_similarity(output_dir, cate_name, k=50, metric="cosine", kinds=("item",), block_size=None, workers=1):
+    category_dir = os.path.join(output_dir, cate_name)
+    train_data, num_users, num_items = load_train_pairs(category_dir, cate_name)
+    matrix = build_interaction_matrix(train_data, num_users, num_items)
+    save_csr(matrix, category_dir, cate_name)
+    print(f"🔢 {cate_name}: {num_users} users x {num_items} items, {matrix.nnz} interactions")
+
+    for kind in kinds:
+        rows = matrix.T.tocsr() if kind == "item" else matrix
+        files = {name: file_name.format(cate=cate_name, kind=kind) for name, file_name in TOPK_FILES.items()}
+        topk_similarity(rows, k, metric, os.path.join(category_dir, files["indices"]),
+                        os.path.join(category_dir, files["scores"]), block_size, workers,
+                        desc=f"Top-{k} {kind}-{kind} {metric} {cate_name}")
+        manifest = {"category": cate_name, "kind": kind, "metric": metric, "k": k, "rows": rows.shape[0],
+                    "num_users": num_users, "num_items": num_items, "files": files}
+        with open(os.path.join(category_dir, TOPK_MANIFEST.format(cate=cate_name, kind=kind)), "w") as f:
+            json.dump(manifest, f, indent=2)
+    print(f"✅ Saved similarity of {cate_name} to {category_dir}")
+
+# ==== Gọi script từ dòng lệnh ====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", default="../data/output", help="Thư mục output của pre_process.py")
+    parser.add_argument("--categories", nargs='+', required=True, help="Danh sách tên category")
+    parser.add_argument("--k", type=int, default=50, help="Số láng giềng giữ lại cho mỗi item/user")
+    parser.add_argument("--metric", default="cosine", choices=METRICS, help="Độ đo tương đồng")
+    parser.add_argument("--kinds", nargs='+', default=["item"], choices=["item", "user"],
+                        help="Tính item-item và/hoặc user-user")
+    parser.add_argument("--block_size", type=int, default=None,
+                        help="Số dòng mỗi block (mặc định chia sao cho mỗi block có ~20M cặp cùng xuất hiện)")
+    parser.add_argument("--workers", type=int, default=1, help="Số process tính các block song song")
+    args = parser.parse_args()
+
+    for cate_name in args.categories:
+        build_similarity(args.output_dir, cate_name, args.k, args.metric, args.kinds, args.block_size, args.workers)
+
+# === RUN ===: python similarity.py --output_dir ../data/output --categories Gift_Cards --k 50 --metric cosine --workers 4